@@ -60,3 +60,10 @@ if django.VERSION >= (1, 4):
             self["Location"] = url
 else:
     from django.http import HttpResponseRedirect as UnsafeRedirect
+
+
+try:
+    from django.utils.deprecation import MiddlewareMixin
+except ImportError:
+    # Django < 1.10 only knows MIDDLEWARE_CLASSES
+    MiddlewareMixin = object
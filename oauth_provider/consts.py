@@ -7,6 +7,9 @@ KEY_SIZE = getattr(settings, 'OAUTH_PROVIDER_KEY_SIZE', 32)
 SECRET_SIZE = getattr(settings, 'OAUTH_PROVIDER_SECRET_SIZE', 16)
 VERIFIER_SIZE = getattr(settings, 'OAUTH_PROVIDER_VERIFIER_SIZE', 10)
 CONSUMER_KEY_SIZE = getattr(settings, 'OAUTH_PROVIDER_CONSUMER_KEY_SIZE', 256)
+NONCE_VALID_PERIOD = getattr(settings, 'OAUTH_NONCE_VALID_PERIOD', None)
+REQUEST_TOKEN_LIFETIME = getattr(settings, 'OAUTH_REQUEST_TOKEN_LIFETIME', None)
+ACCESS_TOKEN_LIFETIME = getattr(settings, 'OAUTH_ACCESS_TOKEN_LIFETIME', None)
 MAX_URL_LENGTH = 2083 # http://www.boutell.com/newfaq/misc/urllength.html
 
 PENDING = 1
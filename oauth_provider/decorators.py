@@ -5,6 +5,7 @@ from functools import wraps
 import oauth2 as oauth
 from django.utils.translation import ugettext as _
 
+from .ratelimit import check_rate_limit
 from .responses import (COULD_NOT_VERIFY_OAUTH_REQUEST_RESPONSE,
                         INVALID_CONSUMER_RESPONSE,
                         INVALID_PARAMS_RESPONSE,
@@ -12,7 +13,9 @@ from .responses import (COULD_NOT_VERIFY_OAUTH_REQUEST_RESPONSE,
 from .store import (InvalidConsumerError,
                     InvalidTokenError,
                     store)
+from .timing import timed
 from .utils import (get_oauth_request,
+                    prevalidate_oauth_request,
                     send_oauth_error,
                     verify_oauth_request)
 
@@ -22,12 +25,65 @@ except ImportError:
     from django.utils.functional import update_wrapper  # Python 2.3, 2.4 fallback.
 
 
+def authenticate_oauth_request(request):
+    """
+    Verify an OAuth signed request for a protected resource. Returns a
+    `(consumer, token, None)` tuple on success and `(None, None, response)`
+    with the error response to send otherwise.
+
+    The nonce is consumed here, so this must run only once per request.
+    """
+    oauth_request = get_oauth_request(request)
+    if oauth_request is None:
+        return None, None, INVALID_PARAMS_RESPONSE
+
+    invalid_request = prevalidate_oauth_request(oauth_request, ('oauth_token',))
+    if invalid_request is not None:
+        return None, None, invalid_request
+
+    rate_limited = check_rate_limit(oauth_request, oauth_request.get_parameter('oauth_token'))
+    if rate_limited is not None:
+        return None, None, rate_limited
+
+    with timed('token') as phase:
+        try:
+            consumer, token = store.get_consumer_and_access_token(
+                request, oauth_request, oauth_request['oauth_consumer_key'],
+                oauth_request.get_parameter('oauth_token'))
+        except InvalidConsumerError:
+            phase.ok = False
+            return None, None, INVALID_CONSUMER_RESPONSE
+        except InvalidTokenError:
+            phase.ok = False
+            return None, None, send_oauth_error(
+                oauth.Error(_('Invalid access token: %s') % oauth_request.get_parameter('oauth_token')))
+
+    if not verify_oauth_request(request, oauth_request, consumer, token):
+        return None, None, COULD_NOT_VERIFY_OAUTH_REQUEST_RESPONSE
+
+    return consumer, token, None
+
+
+def oauth_authentication_exempt(view_func):
+    """
+    Mark a view `OAuthAuthenticationMiddleware` must leave alone, such as the
+    token endpoints which verify their signed requests themselves.
+    """
+    def wrapped_view(*args, **kwargs):
+        return view_func(*args, **kwargs)
+    wrapped_view.oauth_authentication_exempt = True
+    return wraps(view_func)(wrapped_view)
+
+
 class CheckOauth(object):
     """
     Decorator that checks that the OAuth parameters passes the given test, raising
     an OAuth error otherwise. If the test is passed, the view function
     is invoked.
 
+    When `OAuthAuthenticationMiddleware` already authenticated the request,
+    only its result is checked.
+
     We use a class here so that we can define __get__. This way, when a
     CheckOAuth object is used as a method decorator, the view function
     is properly bound to its instance.
@@ -48,24 +104,12 @@ class CheckOauth(object):
 
         @wraps(view_func)
         def wrapped_view(request, *args, **kwargs):
-            oauth_request = get_oauth_request(request)
-            if oauth_request is None:
-                return INVALID_PARAMS_RESPONSE
-
-            try:
-                consumer = store.get_consumer(request, oauth_request, oauth_request['oauth_consumer_key'])
-            except InvalidConsumerError:
-                return INVALID_CONSUMER_RESPONSE
-
-            try:
-                token = store.get_access_token(request, oauth_request, consumer,
-                                               oauth_request.get_parameter('oauth_token'))
-            except InvalidTokenError:
-                return send_oauth_error(
-                    oauth.Error(_('Invalid access token: %s') % oauth_request.get_parameter('oauth_token')))
-
-            if not verify_oauth_request(request, oauth_request, consumer, token):
-                return COULD_NOT_VERIFY_OAUTH_REQUEST_RESPONSE
+            if hasattr(request, 'oauth_token'):
+                token, error = request.oauth_token, request.oauth_error
+            else:
+                consumer, token, error = authenticate_oauth_request(request)
+            if error is not None:
+                return error
 
             if self.scope_name and (not token.scope
                                     or token.scope.name != self.scope_name):
@@ -0,0 +1,27 @@
+from __future__ import absolute_import
+
+from django.core.management.base import BaseCommand
+
+from oauth_provider.consts import ACCESS_TOKEN_LIFETIME
+from oauth_provider.models import Token
+
+
+class Command(BaseCommand):
+    help = ('Delete access tokens older than the lifetime of their consumer or '
+            'OAUTH_ACCESS_TOKEN_LIFETIME in small batches. '
+            'Safe to run continuously next to production traffic.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=ACCESS_TOKEN_LIFETIME,
+                            help='Age in seconds after which an access token of a consumer without '
+                                 'a lifetime of its own is deleted (defaults to OAUTH_ACCESS_TOKEN_LIFETIME).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rows deleted per statement.')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to wait between two batches.')
+
+    def handle(self, *args, **options):
+        deleted, duration = Token.objects.delete_expired_access_tokens(
+            options['max_age'], options['batch_size'], options['sleep'])
+        rate = deleted / duration if duration else 0
+        self.stdout.write('Deleted %d expired access tokens in %.2fs (%.0f tokens/s).' % (deleted, duration, rate))
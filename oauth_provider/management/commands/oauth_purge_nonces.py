@@ -0,0 +1,28 @@
+from __future__ import absolute_import
+
+from django.core.management.base import BaseCommand, CommandError
+
+from oauth_provider.consts import NONCE_VALID_PERIOD
+from oauth_provider.models import Nonce
+
+
+class Command(BaseCommand):
+    help = ('Delete nonces older than OAUTH_NONCE_VALID_PERIOD in small batches. '
+            'Safe to run continuously next to production traffic.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=NONCE_VALID_PERIOD,
+                            help='Age in seconds after which a nonce is deleted '
+                                 '(defaults to OAUTH_NONCE_VALID_PERIOD).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rows deleted per statement.')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to wait between two batches.')
+
+    def handle(self, *args, **options):
+        if not options['max_age']:
+            # without a validity period every nonce may still be replayed
+            raise CommandError('OAUTH_NONCE_VALID_PERIOD is not set, pass --max-age.')
+
+        result = Nonce.objects.delete_expired(options['max_age'], options['batch_size'], options['sleep'])
+        self.stdout.write('Deleted %d expired nonces in %.2fs.' % result)
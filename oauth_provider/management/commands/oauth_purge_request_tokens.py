@@ -0,0 +1,29 @@
+from __future__ import absolute_import
+
+from django.core.management.base import BaseCommand, CommandError
+
+from oauth_provider.consts import REQUEST_TOKEN_LIFETIME
+from oauth_provider.models import Token
+
+
+class Command(BaseCommand):
+    help = ('Delete request tokens older than OAUTH_REQUEST_TOKEN_LIFETIME in small batches. '
+            'Safe to run continuously next to production traffic.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=REQUEST_TOKEN_LIFETIME,
+                            help='Age in seconds after which a request token is deleted '
+                                 '(defaults to OAUTH_REQUEST_TOKEN_LIFETIME).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rows deleted per statement.')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to wait between two batches.')
+
+    def handle(self, *args, **options):
+        if not options['max_age']:
+            # without a lifetime a request token may still be exchanged
+            raise CommandError('OAUTH_REQUEST_TOKEN_LIFETIME is not set, pass --max-age.')
+
+        result = Token.objects.delete_expired_request_tokens(
+            options['max_age'], options['batch_size'], options['sleep'])
+        self.stdout.write('Deleted %d expired request tokens in %.2fs.' % result)
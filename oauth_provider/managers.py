@@ -1,19 +1,139 @@
 from __future__ import absolute_import
 
-from django.db import models
+import uuid
+from collections import namedtuple
+from time import sleep, time
+
+from django.db import models, router
+from django.db.models import F, Q
+
+from oauth_provider.compat import get_random_string
+from oauth_provider.consts import ACCESS_TOKEN_LIFETIME, NONCE_VALID_PERIOD, REQUEST_TOKEN_LIFETIME, SECRET_SIZE
+from oauth_provider.signals import tokens_revoked
+
+PurgeResult = namedtuple('PurgeResult', ['deleted', 'duration'])
+
+
+def delete_in_batches(queryset, batch_size=1000, pause=0):
+    """
+    Delete the rows matched by `queryset` in chunks of `batch_size`, sleeping
+    `pause` seconds between chunks so that no single statement holds locks for
+    long. Returns a `PurgeResult` with the number of deleted rows and the time
+    it took in seconds.
+    """
+    # read and delete on the same database, a lagging replica would keep
+    # returning rows that are already gone
+    using = router.db_for_write(queryset.model)
+    queryset = queryset.using(using)
+    manager = queryset.model._base_manager.db_manager(using)
+
+    started = time()
+    deleted = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        count, _ = manager.filter(pk__in=pks).delete()
+        deleted += count
+        if len(pks) < batch_size:
+            break
+        if pause:
+            sleep(pause)
+    return PurgeResult(deleted, time() - started)
+
+
+class NonceManager(models.Manager):
+    def expired(self, valid_period=None):
+        """
+        Nonces whose timestamp is too old for `check_nonce` to accept anyway.
+        """
+        if valid_period is None:
+            valid_period = NONCE_VALID_PERIOD
+        if not valid_period:
+            return self.none()
+        return self.filter(timestamp__lt=int(time()) - valid_period)
+
+    def delete_expired(self, valid_period=None, batch_size=1000, pause=0):
+        """Delete expired nonces in batches, see `delete_in_batches`."""
+        return delete_in_batches(self.expired(valid_period), batch_size, pause)
+
+
+class TokenQuerySet(models.QuerySet):
+    def delete(self):
+        """Delete the tokens and send `tokens_revoked` once with their keys."""
+        keys = list(self.values_list('key', flat=True))
+        deleted, rows_count = super(TokenQuerySet, self).delete()
+        tokens_revoked.send(sender=self.model, keys=keys, user=None, consumer=None, count=deleted)
+        return deleted, rows_count
+    delete.alters_data = True
+    delete.queryset_only = True
 
 
 class TokenManager(models.Manager):
+    def get_queryset(self):
+        return TokenQuerySet(self.model, using=self._db)
+
+    def make_token(self, consumer, token_type, timestamp, scope,
+            user=None, callback=None, callback_confirmed=False):
+        """Return an unsaved token with random key/secret."""
+        return self.model(consumer=consumer,
+                          token_type=token_type,
+                          timestamp=timestamp,
+                          scope=scope,
+                          user=user,
+                          callback=callback,
+                          callback_confirmed=callback_confirmed,
+                          key=uuid.uuid4().hex,
+                          secret=get_random_string(length=SECRET_SIZE))
+
     def create_token(self, consumer, token_type, timestamp, scope,
             user=None, callback=None, callback_confirmed=False):
-        """Shortcut to create a token with random key/secret."""
-        token, created = self.get_or_create(consumer=consumer, 
-                                            token_type=token_type, 
-                                            timestamp=timestamp,
-                                            scope=scope,
-                                            user=user,
-                                            callback=callback,
-                                            callback_confirmed=callback_confirmed)
-        if created:
-            token.generate_random_codes()
+        """Shortcut to create a token with random key/secret in a single INSERT."""
+        token = self.make_token(consumer, token_type, timestamp, scope,
+                                user=user, callback=callback,
+                                callback_confirmed=callback_confirmed)
+        token.save(force_insert=True, using=self.db)
         return token
+
+    def bulk_create_tokens(self, tokens, batch_size=None):
+        """
+        Create many tokens with as few INSERTs as possible. `tokens` is an
+        iterable of dicts of `make_token` arguments.
+        """
+        return self.bulk_create([self.make_token(**kwargs) for kwargs in tokens],
+                                batch_size=batch_size)
+
+    def expired_request_tokens(self, lifetime=None):
+        """
+        Request tokens too old for `get_request_token` to return, approved or
+        not: they can no longer be exchanged.
+        """
+        if lifetime is None:
+            lifetime = REQUEST_TOKEN_LIFETIME
+        if not lifetime:
+            return self.none()
+        return self.filter(token_type=self.model.REQUEST, timestamp__lt=int(time()) - lifetime)
+
+    def delete_expired_request_tokens(self, lifetime=None, batch_size=1000, pause=0):
+        """Delete expired request tokens in batches, see `delete_in_batches`."""
+        return delete_in_batches(self.expired_request_tokens(lifetime), batch_size, pause)
+
+    def expired_access_tokens(self, lifetime=None):
+        """
+        Access tokens older than the lifetime of their consumer, or than
+        `lifetime` (defaults to `OAUTH_ACCESS_TOKEN_LIFETIME`) for consumers
+        without one.
+        """
+        if lifetime is None:
+            lifetime = ACCESS_TOKEN_LIFETIME
+        now = int(time())
+        expired = Q(consumer__access_token_lifetime__gt=0,
+                    timestamp__lt=now - F('consumer__access_token_lifetime'))
+        if lifetime:
+            default_lifetime = Q(consumer__access_token_lifetime__isnull=True) | Q(consumer__access_token_lifetime=0)
+            expired |= default_lifetime & Q(timestamp__lt=now - lifetime)
+        return self.filter(expired, token_type=self.model.ACCESS)
+
+    def delete_expired_access_tokens(self, lifetime=None, batch_size=1000, pause=0):
+        """Delete expired access tokens in batches, see `delete_in_batches`."""
+        return delete_in_batches(self.expired_access_tokens(lifetime), batch_size, pause)
@@ -0,0 +1,33 @@
+from __future__ import absolute_import
+
+from oauth_provider.compat import MiddlewareMixin
+from oauth_provider.decorators import authenticate_oauth_request
+
+
+class OAuthAuthenticationMiddleware(MiddlewareMixin):
+    """
+    Authenticate OAuth signed requests once, before the view runs.
+
+    Sets `request.oauth_consumer` and `request.oauth_token` (both `None` when
+    the request could not be authenticated, `request.oauth_error` then holds
+    the response explaining why) and `request.user` to the token's user.
+    `oauth_required` then only checks these attributes, so any number of
+    protected views, decorators or permission checks can look at the same
+    request without repeating the lookups or tripping the nonce check.
+
+    Views marked with `oauth_authentication_exempt`, such as the request and
+    access token endpoints, are skipped: they verify their own requests and
+    would otherwise pay for the lookups and the rate limit twice.
+
+    Must be placed after `AuthenticationMiddleware`.
+    """
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'oauth_authentication_exempt', False):
+            return None
+
+        consumer, token, error = authenticate_oauth_request(request)
+        request.oauth_consumer = consumer
+        request.oauth_token = token
+        request.oauth_error = error
+        if token is not None and token.user:
+            request.user = token.user
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+from django.db import migrations, router
+from django.db.models import Count, Min
+
+UNIQUE_FIELDS = ('consumer_key', 'token_key', 'key', 'timestamp')
+
+
+def _unique_columns(model):
+    return [model._meta.get_field(field).column for field in UNIQUE_FIELDS]
+
+
+def _unique_index_name(schema_editor, model):
+    # the name AlterUniqueTogether would have given the constraint
+    return schema_editor._create_index_name(model, _unique_columns(model), suffix='_uniq')
+
+
+def delete_duplicate_nonces(apps, schema_editor):
+    """
+    `get_or_create` was racy, so concurrent requests may have stored the same
+    nonce twice. Keep the oldest row of each group so the constraint applies.
+    """
+    Nonce = apps.get_model('oauth_provider', 'Nonce')
+    nonces = Nonce.objects.using(schema_editor.connection.alias)
+    duplicates = (nonces.values(*UNIQUE_FIELDS)
+                        .annotate(first_id=Min('id'), count=Count('id'))
+                        .filter(count__gt=1))
+    for duplicate in duplicates:
+        first_id = duplicate.pop('first_id')
+        duplicate.pop('count')
+        nonces.filter(**duplicate).exclude(id=first_id).delete()
+
+
+def add_nonce_unique_index(apps, schema_editor):
+    """
+    On PostgreSQL the index is built with CREATE INDEX CONCURRENTLY and then
+    attached as the constraint, so nonce INSERTs are not blocked while the
+    table is scanned. A build that failed on a nonce duplicated since the
+    cleanup leaves an invalid index behind, it is dropped before retrying.
+    """
+    Nonce = apps.get_model('oauth_provider', 'Nonce')
+    connection = schema_editor.connection
+    if not router.allow_migrate_model(connection.alias, Nonce):
+        return
+    if connection.vendor == 'postgresql':
+        if schema_editor._constraint_names(Nonce, _unique_columns(Nonce), unique=True):
+            return
+        table = schema_editor.quote_name(Nonce._meta.db_table)
+        name = schema_editor.quote_name(_unique_index_name(schema_editor, Nonce))
+        schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS %s' % name)
+        schema_editor.execute('CREATE UNIQUE INDEX CONCURRENTLY %s ON %s (%s)' % (
+            name, table, ', '.join(schema_editor.quote_name(column) for column in _unique_columns(Nonce))))
+        schema_editor.execute('ALTER TABLE %s ADD CONSTRAINT %s UNIQUE USING INDEX %s' % (
+            table, name, name))
+    else:
+        schema_editor.alter_unique_together(Nonce, [], [UNIQUE_FIELDS])
+
+
+def remove_nonce_unique_index(apps, schema_editor):
+    Nonce = apps.get_model('oauth_provider', 'Nonce')
+    connection = schema_editor.connection
+    if not router.allow_migrate_model(connection.alias, Nonce):
+        return
+    if connection.vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE %s DROP CONSTRAINT IF EXISTS %s' % (
+            schema_editor.quote_name(Nonce._meta.db_table),
+            schema_editor.quote_name(_unique_index_name(schema_editor, Nonce))))
+    else:
+        schema_editor.alter_unique_together(Nonce, [UNIQUE_FIELDS], [])
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('oauth_provider', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_nonces, migrations.RunPython.noop, hints={'model_name': 'nonce'}),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_nonce_unique_index, remove_nonce_unique_index),
+            ],
+            state_operations=[
+                migrations.AlterUniqueTogether(
+                    name='nonce',
+                    unique_together=set([('consumer_key', 'token_key', 'key', 'timestamp')]),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+from django.db import IntegrityError, migrations, models, router
+from django.db.models import Count
+
+UNIQUE_KEY_MODELS = ('Consumer', 'Token')
+
+
+def _unique_key_index_name(model):
+    return '%s_key_uniq' % model._meta.db_table
+
+
+def _like_index_name(schema_editor, model):
+    return schema_editor._create_index_name(model, [model._meta.get_field('key').column], suffix='_like')
+
+
+def _key_fields(model):
+    """Return the historical `key` field and its unique counterpart."""
+    key_field = model._meta.get_field('key')
+    name, path, args, kwargs = key_field.deconstruct()
+    kwargs['unique'] = True
+    unique_key_field = key_field.__class__(*args, **kwargs)
+    unique_key_field.set_attributes_from_name(name)
+    unique_key_field.model = model
+    return key_field, unique_key_field
+
+
+def _check_duplicate_keys(model, using):
+    """
+    Unlike duplicate nonces, rows sharing a key cannot simply be deleted: they
+    are live consumers and tokens, someone has to decide which one to keep.
+    """
+    duplicates = (model._default_manager.using(using)
+                  .exclude(key=None)
+                  .values('key')
+                  .annotate(count=Count('id'))
+                  .filter(count__gt=1)
+                  .values_list('key', flat=True))
+    duplicates = list(duplicates[:10])
+    if duplicates:
+        raise IntegrityError(
+            "Cannot add a unique constraint on %s.key, these keys are used by more "
+            "than one row (up to 10 shown): %s. Remove or rekey the duplicates and "
+            "run the migration again." % (model.__name__, ', '.join(duplicates)))
+
+
+def add_unique_key_indexes(apps, schema_editor):
+    """
+    On PostgreSQL the index is built with CREATE INDEX CONCURRENTLY and then
+    attached as the constraint, so writes are never blocked while the token
+    table is scanned. The `_like` index Django adds next to unique varchar
+    columns is built concurrently as well, later migrations altering `key`
+    expect to find it. Other backends use their regular (online on InnoDB)
+    ALTER TABLE. A failed concurrent build leaves an invalid index behind, it
+    is dropped before retrying.
+    """
+    connection = schema_editor.connection
+    for model_name in UNIQUE_KEY_MODELS:
+        model = apps.get_model('oauth_provider', model_name)
+        if not router.allow_migrate_model(connection.alias, model):
+            continue
+        _check_duplicate_keys(model, connection.alias)
+        if connection.vendor == 'postgresql':
+            table = schema_editor.quote_name(model._meta.db_table)
+            name = schema_editor.quote_name(_unique_key_index_name(model))
+            if not schema_editor._constraint_names(model, ['key'], unique=True):
+                schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS %s' % name)
+                schema_editor.execute('CREATE UNIQUE INDEX CONCURRENTLY %s ON %s (%s)' % (
+                    name, table, schema_editor.quote_name('key')))
+                schema_editor.execute('ALTER TABLE %s ADD CONSTRAINT %s UNIQUE USING INDEX %s' % (
+                    table, name, name))
+            key_field, unique_key_field = _key_fields(model)
+            like_index = schema_editor._create_like_index_sql(model, unique_key_field)
+            if like_index is not None:
+                schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS %s' % (
+                    schema_editor.quote_name(_like_index_name(schema_editor, model)),))
+                schema_editor.execute(like_index.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1))
+        else:
+            key_field, unique_key_field = _key_fields(model)
+            schema_editor.alter_field(model, key_field, unique_key_field)
+
+
+def remove_unique_key_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    for model_name in UNIQUE_KEY_MODELS:
+        model = apps.get_model('oauth_provider', model_name)
+        if not router.allow_migrate_model(connection.alias, model):
+            continue
+        if connection.vendor == 'postgresql':
+            schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS %s' % (
+                schema_editor.quote_name(_like_index_name(schema_editor, model)),))
+            schema_editor.execute('ALTER TABLE %s DROP CONSTRAINT %s' % (
+                schema_editor.quote_name(model._meta.db_table),
+                schema_editor.quote_name(_unique_key_index_name(model))))
+        else:
+            key_field, unique_key_field = _key_fields(model)
+            schema_editor.alter_field(model, unique_key_field, key_field)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('oauth_provider', '0002_nonce_unique'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_unique_key_indexes, remove_unique_key_indexes),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='consumer',
+                    name='key',
+                    field=models.CharField(max_length=256, unique=True),
+                ),
+                migrations.AlterField(
+                    model_name='token',
+                    name='key',
+                    field=models.CharField(blank=True, max_length=32, null=True, unique=True),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oauth_provider', '0003_unique_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consumer',
+            name='rsa_public_key',
+            field=models.TextField(blank=True, help_text='PEM encoded, used to verify RSA-SHA1 signatures.', verbose_name='RSA public key'),
+        ),
+    ]
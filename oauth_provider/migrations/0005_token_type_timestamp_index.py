@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+from django.db import migrations, router
+
+INDEX_FIELDS = ('token_type', 'timestamp')
+
+
+def _index_name(model):
+    return '%s_type_timestamp_idx' % model._meta.db_table
+
+
+def add_type_timestamp_index(apps, schema_editor):
+    """
+    Built with CREATE INDEX CONCURRENTLY on PostgreSQL so token writes are
+    not blocked while the table is scanned, like the unique key indexes.
+    """
+    Token = apps.get_model('oauth_provider', 'Token')
+    connection = schema_editor.connection
+    if not router.allow_migrate_model(connection.alias, Token):
+        return
+    if connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE INDEX CONCURRENTLY %s ON %s (%s)' % (
+            schema_editor.quote_name(_index_name(Token)),
+            schema_editor.quote_name(Token._meta.db_table),
+            ', '.join(schema_editor.quote_name(field) for field in INDEX_FIELDS)))
+    else:
+        schema_editor.alter_index_together(Token, [], [INDEX_FIELDS])
+
+
+def remove_type_timestamp_index(apps, schema_editor):
+    Token = apps.get_model('oauth_provider', 'Token')
+    connection = schema_editor.connection
+    if not router.allow_migrate_model(connection.alias, Token):
+        return
+    if connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX CONCURRENTLY %s' % schema_editor.quote_name(_index_name(Token)))
+    else:
+        schema_editor.alter_index_together(Token, [INDEX_FIELDS], [])
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('oauth_provider', '0004_consumer_rsa_public_key'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_type_timestamp_index, remove_type_timestamp_index),
+            ],
+            state_operations=[
+                migrations.AlterIndexTogether(
+                    name='token',
+                    index_together=set([('token_type', 'timestamp')]),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oauth_provider', '0005_token_type_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consumer',
+            name='access_token_lifetime',
+            field=models.PositiveIntegerField(blank=True, help_text='Seconds its access tokens stay valid, defaults to OAUTH_ACCESS_TOKEN_LIFETIME.', null=True),
+        ),
+    ]
@@ -11,15 +11,18 @@ import six.moves.urllib.request
 from django.db import models
 
 from oauth_provider.compat import AUTH_USER_MODEL, get_random_string
-from oauth_provider.consts import (CONSUMER_KEY_SIZE,
+from oauth_provider.consts import (ACCESS_TOKEN_LIFETIME,
+                                   CONSUMER_KEY_SIZE,
                                    CONSUMER_STATES,
                                    KEY_SIZE,
                                    MAX_URL_LENGTH,
                                    OUT_OF_BAND,
                                    PENDING,
+                                   REQUEST_TOKEN_LIFETIME,
                                    SECRET_SIZE,
                                    VERIFIER_SIZE)
-from oauth_provider.managers import TokenManager
+from oauth_provider.managers import NonceManager, TokenManager
+from oauth_provider.signals import tokens_revoked
 from oauth_provider.utils import check_valid_callback
 
 
@@ -29,6 +32,11 @@ class Nonce(models.Model):
     key = models.CharField(max_length=255)
     timestamp = models.PositiveIntegerField(db_index=True)
 
+    objects = NonceManager()
+
+    class Meta:
+        unique_together = ('consumer_key', 'token_key', 'key', 'timestamp')
+
     def __unicode__(self):
         return u"Nonce %s for %s" % (self.key, self.consumer_key)
 
@@ -57,16 +65,25 @@ class Consumer(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
 
-    key = models.CharField(max_length=CONSUMER_KEY_SIZE)
+    key = models.CharField(max_length=CONSUMER_KEY_SIZE, unique=True)
     secret = models.CharField(max_length=SECRET_SIZE, blank=True)
+    rsa_public_key = models.TextField(u"RSA public key", blank=True,
+                                      help_text=u"PEM encoded, used to verify RSA-SHA1 signatures.")
 
     status = models.SmallIntegerField(choices=CONSUMER_STATES, default=PENDING)
     user = models.ForeignKey(AUTH_USER_MODEL, null=True, blank=True)
     xauth_allowed = models.BooleanField(u"Allow xAuth", default=False)
+    access_token_lifetime = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text=u"Seconds its access tokens stay valid, defaults to OAUTH_ACCESS_TOKEN_LIFETIME.")
 
     def __unicode__(self):
         return u"Consumer %s with key %s" % (self.name, self.key)
 
+    def get_access_token_lifetime(self):
+        """Seconds the access tokens of this consumer stay valid, `None` for ever."""
+        return self.access_token_lifetime or ACCESS_TOKEN_LIFETIME
+
     def generate_random_codes(self):
         """
         Used to generate random key/secret pairings.
@@ -86,7 +103,7 @@ class Token(models.Model):
     ACCESS = 2
     TOKEN_TYPES = ((REQUEST, u'Request'), (ACCESS, u'Access'))
 
-    key = models.CharField(max_length=KEY_SIZE, null=True, blank=True)
+    key = models.CharField(max_length=KEY_SIZE, null=True, blank=True, unique=True)
     secret = models.CharField(max_length=SECRET_SIZE, null=True, blank=True)
     token_type = models.SmallIntegerField(choices=TOKEN_TYPES)
     timestamp = models.IntegerField(default=default_token_timestamp)
@@ -111,9 +128,29 @@ class Token(models.Model):
 
     objects = TokenManager()
 
+    class Meta:
+        # finds the expired request tokens to purge
+        index_together = [('token_type', 'timestamp')]
+
     def __unicode__(self):
         return u"%s Token %s for %s" % (self.get_token_type_display(), self.key, self.consumer)
 
+    def delete(self, *args, **kwargs):
+        result = super(Token, self).delete(*args, **kwargs)
+        tokens_revoked.send(sender=Token, keys=[self.key], user=None, consumer=None, count=1)
+        return result
+
+    def is_expired(self):
+        """
+        Whether the token outlived `OAUTH_REQUEST_TOKEN_LIFETIME` or, for access
+        tokens, the lifetime of its consumer.
+        """
+        if self.token_type == self.REQUEST:
+            lifetime = REQUEST_TOKEN_LIFETIME
+        else:
+            lifetime = self.consumer.get_access_token_lifetime()
+        return bool(lifetime) and self.timestamp < int(time()) - lifetime
+
     def to_string(self, only_key=False):
         token_dict = {
             'oauth_token': self.key,
@@ -162,11 +199,12 @@ class Token(models.Model):
         args = args is not None and "?%s" % six.moves.urllib.parse.urlencode(args) or ""
         return self.callback and self.callback + args
 
-    def set_callback(self, callback):
+    def set_callback(self, callback, save=True):
         if callback != OUT_OF_BAND:  # out of band, says "we can't do this!"
             if check_valid_callback(callback):
                 self.callback = callback
                 self.callback_confirmed = True
-                self.save()
+                if save:
+                    self.save()
             else:
                 raise oauth.Error('Invalid callback URL.')
@@ -0,0 +1,111 @@
+from __future__ import absolute_import
+
+import hashlib
+import math
+from time import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.utils.encoding import force_bytes
+
+from oauth_provider.compat import importlib
+
+# `(requests, seconds)`: bursts of up to `requests` requests are allowed, and
+# the allowance refills at `requests` per `seconds`. `None` disables the limit.
+CONSUMER_RATE_LIMIT = getattr(settings, 'OAUTH_CONSUMER_RATE_LIMIT', None)
+TOKEN_RATE_LIMIT = getattr(settings, 'OAUTH_TOKEN_RATE_LIMIT', None)
+RATE_LIMIT_CACHE = getattr(settings, 'OAUTH_RATE_LIMIT_CACHE', 'default')
+
+
+class RateLimiter(object):
+    """
+    Decides whether a request is let through. Subclasses implement `consume`,
+    set `OAUTH_RATE_LIMITER` to use them.
+    """
+    def consume(self, bucket, key, rate):
+        """
+        Take one request off the allowance of `key` in `bucket` ('consumer'
+        or 'token') limited to `rate`, a `(requests, seconds)` tuple.
+
+        Return 0 when the request is allowed, otherwise the number of seconds
+        until it would be.
+        """
+        raise NotImplementedError
+
+
+class CacheRateLimiter(RateLimiter):
+    """
+    Token buckets kept in the `OAUTH_RATE_LIMIT_CACHE` Django cache.
+
+    Use a cache shared by all processes in production. Updates are not atomic,
+    so concurrent requests can slightly exceed the limit.
+    """
+    def __init__(self, cache_alias=None):
+        self.cache = caches[cache_alias or RATE_LIMIT_CACHE]
+
+    def _cache_key(self, bucket, key):
+        # keys come from the request, keep them safe for memcached
+        return 'oauth_provider:ratelimit:%s:%s' % (bucket, hashlib.md5(force_bytes(key)).hexdigest())
+
+    def consume(self, bucket, key, rate):
+        requests, seconds = rate
+        refill = float(requests) / seconds
+        cache_key = self._cache_key(bucket, key)
+        now = time()
+
+        allowance, updated = self.cache.get(cache_key, (requests, now))
+        allowance = min(requests, allowance + (now - updated) * refill)
+        if allowance < 1:
+            return (1 - allowance) / refill
+
+        # an untouched bucket is full again after `seconds`
+        self.cache.set(cache_key, (allowance - 1, now), int(math.ceil(seconds)))
+        return 0
+
+
+def get_rate_limiter(path='oauth_provider.ratelimit.CacheRateLimiter'):
+    """
+    Load the rate limiter. Should not be called directly unless testing.
+    """
+    path = getattr(settings, 'OAUTH_RATE_LIMITER', path)
+
+    try:
+        module, attr = path.rsplit('.', 1)
+        limiter_class = getattr(importlib.import_module(module), attr)
+    except ValueError:
+        raise ImproperlyConfigured('Invalid rate limiter string: "%s"' % path)
+    except ImportError as e:
+        raise ImproperlyConfigured('Error loading rate limiter module "%s": "%s"' % (module, e))
+    except AttributeError:
+        raise ImproperlyConfigured('Module "%s" does not define a rate limiter named "%s"' % (module, attr))
+
+    return limiter_class()
+
+
+rate_limiter = get_rate_limiter()
+
+
+def rate_limited_response(retry_after):
+    response = HttpResponse('Rate limit exceeded.', status=429, content_type='text/plain')
+    response['Retry-After'] = str(int(math.ceil(retry_after)))
+    return response
+
+
+def check_rate_limit(oauth_request, token_key=None):
+    """
+    Return a 429 response when the consumer, or the token when `token_key` is
+    given, is over its limit, `None` otherwise.
+
+    Runs once the request passed `prevalidate_oauth_request` and before any
+    signature is verified or store is queried.
+    """
+    retry_after = 0
+    if CONSUMER_RATE_LIMIT:
+        retry_after = rate_limiter.consume('consumer', oauth_request['oauth_consumer_key'], CONSUMER_RATE_LIMIT)
+    if not retry_after and TOKEN_RATE_LIMIT and token_key:
+        retry_after = rate_limiter.consume('token', token_key, TOKEN_RATE_LIMIT)
+    if retry_after:
+        return rate_limited_response(retry_after)
+    return None
@@ -0,0 +1,39 @@
+from __future__ import absolute_import
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+NONCE_DATABASE = getattr(settings, 'OAUTH_NONCE_DATABASE', None)
+
+
+class NonceRouter(object):
+    """
+    Keeps the `Nonce` model on the `OAUTH_NONCE_DATABASE` database alias and
+    the other `oauth_provider` models off it.
+
+    Add `'oauth_provider.routers.NonceRouter'` to `DATABASE_ROUTERS` and run
+    `migrate --database <alias>` for that alias too. Nonces are only ever
+    looked up by their own fields, so they need nothing else on that database.
+    """
+    def _is_nonce(self, app_label, model_name):
+        return app_label == 'oauth_provider' and model_name == 'nonce'
+
+    def _db_for_model(self, model):
+        if NONCE_DATABASE and self._is_nonce(model._meta.app_label, model._meta.model_name):
+            return NONCE_DATABASE
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._db_for_model(model)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for_model(model)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not NONCE_DATABASE or app_label != 'oauth_provider' or model_name is None:
+            return None
+        if self._is_nonce(app_label, model_name):
+            return db == NONCE_DATABASE
+        if db == NONCE_DATABASE and db != DEFAULT_DB_ALIAS:
+            return False
+        return None
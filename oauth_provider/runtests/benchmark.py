@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark the OAuth endpoints against the test settings on SQLite.
+
+    python oauth_provider/runtests/benchmark.py [--iterations 200] [--rows 0,10000] [--output results.json]
+
+Each endpoint is driven with PLAINTEXT and HMAC-SHA1 signatures, through the
+Django test client and straight through the WSGI handler, after filling the
+Token and Nonce tables up to each of the `--rows` sizes. Results are written
+as JSON so runs of different releases can be compared.
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import uuid
+
+import django
+
+os.environ['DJANGO_SETTINGS_MODULE'] = 'oauth_provider.runtests.settings'
+django.setup()
+
+import oauth2 as oauth
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.test import Client
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from oauth_provider.compat import get_user_model
+from oauth_provider.models import Consumer, Nonce, Scope, Token
+
+SIGNATURE_METHODS = {
+    'PLAINTEXT': oauth.SignatureMethod_PLAINTEXT(),
+    'HMAC-SHA1': oauth.SignatureMethod_HMAC_SHA1(),
+}
+
+USERNAME, PASSWORD = 'bench', 'bench'
+
+
+class WSGIClient(object):
+    """Calls the WSGI handler directly, without the test client machinery."""
+    def __init__(self):
+        self.handler = WSGIHandler()
+        self.factory = RequestFactory()
+
+    def get(self, path, data=None):
+        environ = self.factory.get(path, data).environ
+        status = []
+        body = b''.join(self.handler(environ, lambda s, headers, exc_info=None: status.append(s)))
+        return int(status[0].split(' ', 1)[0]), body
+
+
+class TestClient(object):
+    def __init__(self):
+        self.client = Client()
+
+    def get(self, path, data=None):
+        response = self.client.get(path, data)
+        return response.status_code, response.content
+
+
+class Benchmark(object):
+    def __init__(self, iterations):
+        self.iterations = iterations
+        self.counter = 0
+        self.user = get_user_model().objects.create_user(USERNAME, 'bench@example.com', PASSWORD)
+        self.scope = Scope.objects.create(name='photos', url='/oauth/photo/')
+        self.consumer = Consumer.objects.create(key='benchconsumerkey', secret='benchconsumersecret',
+                                                name='bench', user=self.user)
+        self.oauth_consumer = oauth.Consumer(self.consumer.key, self.consumer.secret)
+        self.access_token = Token.objects.create_token(
+            consumer=self.consumer, token_type=Token.ACCESS, timestamp=int(time.time()),
+            scope=self.scope, user=self.user)
+
+    def fill_tables(self, rows):
+        """Add access tokens and nonces until both tables hold `rows` rows."""
+        now = int(time.time())
+        Token.objects.bulk_create_tokens(
+            (dict(consumer=self.consumer, token_type=Token.ACCESS, timestamp=now, scope=self.scope)
+             for i in range(rows - Token.objects.count())), batch_size=500)
+        Nonce.objects.bulk_create(
+            [Nonce(consumer_key=self.consumer.key, token_key='', key=uuid.uuid4().hex, timestamp=now)
+             for i in range(rows - Nonce.objects.count())], batch_size=500)
+
+    def _signed_parameters(self, signature_method, path, token=None, **parameters):
+        self.counter += 1
+        parameters.update(oauth_nonce='bench%d' % self.counter, oauth_timestamp=str(int(time.time())))
+        oauth_token = oauth.Token(token.key, token.secret) if token is not None else None
+        oauth_request = oauth.Request.from_consumer_and_token(
+            self.oauth_consumer, oauth_token, http_method='GET',
+            http_url='http://testserver' + path, parameters=parameters)
+        oauth_request.sign_request(SIGNATURE_METHODS[signature_method], self.oauth_consumer, oauth_token)
+        return dict(oauth_request)
+
+    def _authorized_request_token(self):
+        token = Token.objects.create_token(
+            consumer=self.consumer, token_type=Token.REQUEST, timestamp=int(time.time()),
+            scope=self.scope, user=self.user, callback='oob', callback_confirmed=True)
+        token.is_approved = True
+        token.verifier = uuid.uuid4().hex[:10]
+        token.save()
+        return token
+
+    # Each `prepare_*` method returns a callable doing a single request; the
+    # work it does beforehand is not measured.
+
+    def prepare_request_token(self, client, signature_method):
+        path = '/oauth/request_token/'
+        parameters = self._signed_parameters(signature_method, path, oauth_callback='oob')
+        return lambda: client.get(path, parameters)
+
+    def prepare_user_authorization(self, client, signature_method):
+        # the authorization form is not signed, only the logged in user counts
+        token = Token.objects.create_token(
+            consumer=self.consumer, token_type=Token.REQUEST, timestamp=int(time.time()),
+            scope=self.scope, callback='http://consumer.example.com/ready', callback_confirmed=True)
+        path = '/oauth/authorize/'
+
+        def authorize():
+            client.client.get(path, {'oauth_token': token.key})
+            response = client.client.post(path, {'oauth_token': token.key, 'authorize_access': 1})
+            return response.status_code, response.content
+        return authorize
+
+    def prepare_access_token(self, client, signature_method):
+        token = self._authorized_request_token()
+        path = '/oauth/access_token/'
+        parameters = self._signed_parameters(signature_method, path, token, oauth_verifier=token.verifier)
+        return lambda: client.get(path, parameters)
+
+    def prepare_protected_resource(self, client, signature_method):
+        path = '/oauth/photo/'
+        parameters = self._signed_parameters(signature_method, path, self.access_token)
+        return lambda: client.get(path, parameters)
+
+    def run(self, endpoint, client, signature_method, expected_status):
+        prepare = getattr(self, 'prepare_%s' % endpoint)
+        durations = []
+        for i in range(self.iterations):
+            request = prepare(client, signature_method)
+            started = time.time()
+            status, body = request()
+            durations.append(time.time() - started)
+            if status != expected_status:
+                raise AssertionError('%s returned %s: %r' % (endpoint, status, body))
+
+        # count queries separately so the debug cursor does not skew timings
+        samples = 10
+        with CaptureQueriesContext(connection) as queries:
+            for i in range(samples):
+                prepare(client, signature_method)
+        setup_queries = len(queries)
+        with CaptureQueriesContext(connection) as queries:
+            for i in range(samples):
+                prepare(client, signature_method)()
+        return durations, float(len(queries) - setup_queries) / samples
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(durations):
+    durations = sorted(durations)
+    return {
+        'ops_per_sec': round(len(durations) / sum(durations), 1),
+        'latency_ms': dict(
+            (name, round(percentile(durations, fraction) * 1000, 3))
+            for name, fraction in [('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0)]),
+    }
+
+
+ENDPOINTS = [
+    # endpoint, expected status, clients
+    ('request_token', 200, ('client', 'wsgi')),
+    ('user_authorization', 302, ('client',)),  # needs a session
+    ('access_token', 200, ('client', 'wsgi')),
+    ('protected_resource', 200, ('client', 'wsgi')),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the OAuth endpoints.')
+    parser.add_argument('--iterations', type=int, default=200, help='requests per measurement')
+    parser.add_argument('--rows', default='0,10000',
+                        help='comma separated Token and Nonce table sizes to measure with')
+    parser.add_argument('--output', help='file to write the JSON results to, stdout by default')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    settings.DEBUG = False
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        benchmark = Benchmark(args.iterations)
+        clients = {'client': TestClient(), 'wsgi': WSGIClient()}
+        clients['client'].client.login(username=USERNAME, password=PASSWORD)
+
+        results = []
+        for rows in sorted(int(rows) for rows in args.rows.split(',')):
+            benchmark.fill_tables(rows)
+            for endpoint, expected_status, client_names in ENDPOINTS:
+                for client_name in client_names:
+                    for signature_method in sorted(SIGNATURE_METHODS):
+                        durations, queries = benchmark.run(
+                            endpoint, clients[client_name], signature_method, expected_status)
+                        result = {
+                            'endpoint': endpoint,
+                            'client': client_name,
+                            'signature_method': signature_method,
+                            'rows': rows,
+                            'iterations': args.iterations,
+                            'queries_per_request': queries,
+                        }
+                        result.update(summarize(durations))
+                        results.append(result)
+                        print('%(endpoint)s %(client)s %(signature_method)s rows=%(rows)d: '
+                              '%(ops_per_sec).1f ops/s' % result, file=sys.stderr)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    report = json.dumps({
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'results': results,
+    }, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(report)
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
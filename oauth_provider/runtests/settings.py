@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 
 import os
+import tempfile
 
 import django
 
@@ -17,9 +18,34 @@ DATABASES = {
         'PASSWORD': '',                  # Not used with sqlite3.
         'HOST': '',                      # Set to empty string for localhost. Not used with sqlite3.
         'PORT': '',                      # Set to empty string for default. Not used with sqlite3.
-    }
+    },
+    # stands for a read replica of 'default' in the OAUTH_READ_DATABASE tests
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': 'testdb.sqlite',
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # SignedTokenModelStore needs a cache shared between processes
+    'revocations': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'oauth_provider_revocations'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    # for CacheNonceModelStore, which refuses the local memory cache too
+    'nonces': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'oauth_provider_nonces'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+OAUTH_REVOCATION_CACHE = 'revocations'
+OAUTH_NONCE_CACHE = 'nonces'
 
 TIME_ZONE = 'America/Chicago'
 LANGUAGE_CODE = 'en-us'
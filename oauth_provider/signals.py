@@ -0,0 +1,12 @@
+from __future__ import absolute_import
+
+from django.dispatch import Signal
+
+# Sent once each time tokens are revoked, with `sender` the Token model: by
+# the store's bulk revocations, `Token.delete()` and `delete()` on querysets
+# of `Token.objects`. `keys` is the list of revoked keys when revoking by key,
+# otherwise `user` or `consumer` is the one whose tokens were all revoked.
+# Deleting through `Token._base_manager`, as the purge commands and the
+# exchange of a request token for an access token do, or by cascade does not
+# send it.
+tokens_revoked = Signal(providing_args=['keys', 'user', 'consumer', 'count'])
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import base64
+import binascii
+import hmac
+from hashlib import sha256
+
+import oauth2 as oauth
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from django.utils.encoding import force_bytes
+
+try:
+    from cryptography.exceptions import InvalidSignature, UnsupportedAlgorithm
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa
+except ImportError:
+    # RSA-SHA1 is only available with the `cryptography` package installed
+    serialization = None
+
+RSA_KEY_CACHE_SIZE = getattr(settings, 'OAUTH_RSA_KEY_CACHE_SIZE', 1000)
+
+_rsa_public_keys = {}
+
+
+def load_rsa_public_key(pem):
+    """
+    Parse a PEM encoded RSA public key, or return `None` if it is invalid.
+
+    Parsed keys are kept in process so the PEM of a consumer is only parsed
+    the first time it signs a request.
+    """
+    if not pem:
+        return None
+    try:
+        return _rsa_public_keys[pem]
+    except KeyError:
+        pass
+
+    try:
+        public_key = serialization.load_pem_public_key(force_bytes(pem), backend=default_backend())
+    except (ValueError, UnsupportedAlgorithm):
+        public_key = None
+    if not isinstance(public_key, rsa.RSAPublicKey):
+        public_key = None
+    if len(_rsa_public_keys) >= RSA_KEY_CACHE_SIZE:
+        _rsa_public_keys.clear()
+    _rsa_public_keys[pem] = public_key
+    return public_key
+
+
+# Signature methods missing from `oauth2`, they are registered with
+# `oauth_provider.utils.signature_method_registry` like the built-in ones.
+
+class SignatureMethod_HMAC_SHA256(oauth.SignatureMethod_HMAC_SHA1):
+    name = 'HMAC-SHA256'
+
+    def sign(self, request, consumer, token):
+        key, raw = self.signing_base(request, consumer, token)
+        hashed = hmac.new(key, raw, sha256)
+        return binascii.b2a_base64(hashed.digest())[:-1]
+
+    def check(self, request, consumer, token, signature):
+        return constant_time_compare(self.sign(request, consumer, token), force_bytes(signature))
+
+
+class SignatureMethod_RSA_SHA1(oauth.SignatureMethod_HMAC_SHA1):
+    """
+    Verifies requests signed with the private key matching the PEM encoded
+    public key found on `consumer.rsa_public_key`.
+    """
+    name = 'RSA-SHA1'
+    available = serialization is not None
+
+    def sign(self, request, consumer, token):
+        raise NotImplementedError('The provider has no private key to sign with.')
+
+    def check(self, request, consumer, token, signature):
+        public_key = load_rsa_public_key(getattr(consumer, 'rsa_public_key', None))
+        if public_key is None:
+            return False
+
+        key, raw = self.signing_base(request, consumer, token)
+        try:
+            public_key.verify(base64.b64decode(force_bytes(signature)), raw, padding.PKCS1v15(), hashes.SHA1())
+        except (InvalidSignature, TypeError, ValueError, binascii.Error):
+            return False
+        return True
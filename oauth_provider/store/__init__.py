@@ -126,6 +126,27 @@ class Store(object):
         """
         raise NotImplementedError
 
+    def get_consumer_and_access_token(self, request, oauth_request, consumer_key, access_token_key):
+        """
+        Return a `(consumer, access_token)` tuple or raise `InvalidConsumerError`
+        or `InvalidTokenError`. The access token must have been issued to the
+        consumer identified by `consumer_key`.
+
+        This is what protects resources on every call, so implementations are
+        encouraged to override it and fetch both in a single lookup.
+
+        `request`: The Django request object.
+        `oauth_request`: The `oauth2.Request` object.
+        `consumer_key`: The consumer key.
+        `access_token_key`: The token key used to make the request.
+        """
+        consumer = self.get_consumer(request, oauth_request, consumer_key)
+        access_token = self.get_access_token(request, oauth_request, consumer, access_token_key)
+        token_consumer = self.get_consumer_for_access_token(request, oauth_request, access_token)
+        if token_consumer.key != consumer.key:
+            raise InvalidTokenError()
+        return consumer, access_token
+
     def get_user_for_access_token(self, request, oauth_request, access_token):
         """
         Return the associated User for `access_token`.
@@ -158,6 +179,30 @@ class Store(object):
         """
         raise NotImplementedError
 
+    def revoke_tokens(self, keys):
+        """
+        Delete the tokens whose key is in `keys`, return how many there were.
+
+        `keys`: The request and access token keys to revoke.
+        """
+        raise NotImplementedError
+
+    def revoke_tokens_for_user(self, user):
+        """
+        Delete all the tokens `user` authorized, return how many there were.
+
+        `user`: The User whose tokens are revoked.
+        """
+        raise NotImplementedError
+
+    def revoke_tokens_for_consumer(self, consumer):
+        """
+        Delete all the tokens issued to `consumer`, return how many there were.
+
+        `consumer`: The Consumer whose tokens are revoked.
+        """
+        raise NotImplementedError
+
 
 def get_store(path='oauth_provider.store.db.ModelStore'):
     """
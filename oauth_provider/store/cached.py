@@ -0,0 +1,255 @@
+from __future__ import absolute_import
+
+import hashlib
+import math
+import struct
+import threading
+from collections import OrderedDict
+from time import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.signals import post_delete, post_save
+from django.utils.encoding import force_bytes
+
+from oauth_provider.consts import NONCE_VALID_PERIOD
+from oauth_provider.models import Consumer, Token
+from oauth_provider.store import InvalidConsumerError, InvalidTokenError
+from oauth_provider.store.db import ModelStore
+
+CONSUMER_CACHE_SIZE = getattr(settings, 'OAUTH_CONSUMER_CACHE_SIZE', 1000)
+CONSUMER_CACHE_TIMEOUT = getattr(settings, 'OAUTH_CONSUMER_CACHE_TIMEOUT', 300)
+
+CONSUMER_FILTER_ERROR_RATE = getattr(settings, 'OAUTH_CONSUMER_FILTER_ERROR_RATE', 0.01)
+CONSUMER_FILTER_REFRESH = getattr(settings, 'OAUTH_CONSUMER_FILTER_REFRESH', 300)
+NEGATIVE_CACHE_SIZE = getattr(settings, 'OAUTH_NEGATIVE_CACHE_SIZE', 10000)
+NEGATIVE_CACHE_TIMEOUT = getattr(settings, 'OAUTH_NEGATIVE_CACHE_TIMEOUT', 30)
+NONCE_CACHE = getattr(settings, 'OAUTH_NONCE_CACHE', 'default')
+
+
+class LRUCache(object):
+    """
+    A small thread-safe in-process cache bounded both in size and in age.
+
+    Entries older than `timeout` seconds are treated as missing; once more than
+    `max_size` entries are stored the least recently used ones are dropped.
+    """
+    def __init__(self, max_size, timeout=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data.pop(key)
+            except KeyError:
+                return default
+            if expires is not None and expires <= time():
+                return default
+            self._data[key] = (value, expires)
+            return value
+
+    def set(self, key, value):
+        expires = time() + self.timeout if self.timeout else None
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class BloomFilter(object):
+    """
+    A set of strings answering "definitely not there" or "maybe there".
+
+    It is sized for `capacity` items with a false positive rate of
+    `error_rate`; items can be added but not removed.
+    """
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, int(round(self.size * math.log(2) / capacity)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # double hashing: two 64 bit halves of one digest give all positions
+        h1, h2 = struct.unpack('>QQ', hashlib.md5(force_bytes(item)).digest())
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class CachedConsumerModelStore(ModelStore):
+    """
+    `ModelStore` serving consumers from a bounded in-process cache.
+
+    Entries are invalidated when a `Consumer` is saved or deleted in this
+    process; changes made by other processes become visible once the cached
+    entry is older than `OAUTH_CONSUMER_CACHE_TIMEOUT` seconds.
+    """
+    def __init__(self):
+        super(CachedConsumerModelStore, self).__init__()
+        self._consumers = LRUCache(CONSUMER_CACHE_SIZE, CONSUMER_CACHE_TIMEOUT)
+        post_save.connect(self._invalidate_consumer, sender=Consumer)
+        post_delete.connect(self._invalidate_consumer, sender=Consumer)
+
+    def _invalidate_consumer(self, sender, instance, **kwargs):
+        # consumers change rarely and their key may just have been edited, so
+        # start over instead of hunting for the stale entry
+        self._consumers.clear()
+
+    def get_consumer(self, request, oauth_request, consumer_key):
+        consumer = self._consumers.get(consumer_key)
+        if consumer is None:
+            consumer = super(CachedConsumerModelStore, self).get_consumer(request, oauth_request, consumer_key)
+            self._consumers.set(consumer_key, consumer)
+        return consumer
+
+
+class FilteredModelStore(ModelStore):
+    """
+    `ModelStore` rejecting unknown consumer and token keys without a query.
+
+    Consumer keys are checked against a Bloom filter of all the keys in the
+    database, rebuilt every `OAUTH_CONSUMER_FILTER_REFRESH` seconds and
+    updated when a `Consumer` is saved in this process; a consumer created by
+    another process is rejected until the next rebuild.
+
+    Token keys are not filtered: tokens are used right after being issued,
+    possibly by another process, so a filter would reject them. Keys that
+    were looked up and missing, consumer and token ones alike, are instead
+    remembered for `OAUTH_NEGATIVE_CACHE_TIMEOUT` seconds.
+    """
+    def __init__(self):
+        super(FilteredModelStore, self).__init__()
+        self._consumer_filter = None
+        self._consumer_filter_expires = 0
+        self._consumer_filter_lock = threading.Lock()
+        self._missing = LRUCache(NEGATIVE_CACHE_SIZE, NEGATIVE_CACHE_TIMEOUT)
+        post_save.connect(self._add_consumer, sender=Consumer)
+
+    def _add_consumer(self, sender, instance, **kwargs):
+        consumer_filter = self._consumer_filter
+        if consumer_filter is not None:
+            consumer_filter.add(instance.key)
+        self._missing.delete((Consumer, instance.key))
+
+    def _get_consumer_filter(self):
+        if self._consumer_filter_expires <= time():
+            with self._consumer_filter_lock:
+                if self._consumer_filter_expires <= time():
+                    keys = list(Consumer.objects.values_list('key', flat=True))
+                    # leave room for the consumers added until the next rebuild
+                    consumer_filter = BloomFilter(2 * len(keys), CONSUMER_FILTER_ERROR_RATE)
+                    for key in keys:
+                        consumer_filter.add(key)
+                    self._consumer_filter = consumer_filter
+                    self._consumer_filter_expires = time() + CONSUMER_FILTER_REFRESH
+        return self._consumer_filter
+
+    def _check_consumer_key(self, consumer_key):
+        if self._missing.get((Consumer, consumer_key)) or consumer_key not in self._get_consumer_filter():
+            raise InvalidConsumerError()
+
+    def _check_token_key(self, token_type, token_key, consumer_key=None):
+        # access tokens of another consumer are invalid, not missing
+        if self._missing.get((Token, token_type, consumer_key, token_key)):
+            raise InvalidTokenError()
+
+    def get_consumer(self, request, oauth_request, consumer_key):
+        self._check_consumer_key(consumer_key)
+        try:
+            return super(FilteredModelStore, self).get_consumer(request, oauth_request, consumer_key)
+        except InvalidConsumerError:
+            self._missing.set((Consumer, consumer_key), True)
+            raise
+
+    def get_request_token(self, request, oauth_request, request_token_key):
+        self._check_token_key(Token.REQUEST, request_token_key)
+        try:
+            return super(FilteredModelStore, self).get_request_token(request, oauth_request, request_token_key)
+        except InvalidTokenError:
+            self._missing.set((Token, Token.REQUEST, None, request_token_key), True)
+            raise
+
+    def get_access_token(self, request, oauth_request, consumer, access_token_key):
+        self._check_token_key(Token.ACCESS, access_token_key, consumer.key)
+        try:
+            return super(FilteredModelStore, self).get_access_token(
+                request, oauth_request, consumer, access_token_key)
+        except InvalidTokenError:
+            self._missing.set((Token, Token.ACCESS, consumer.key, access_token_key), True)
+            raise
+
+    def get_consumer_and_access_token(self, request, oauth_request, consumer_key, access_token_key):
+        self._check_consumer_key(consumer_key)
+        self._check_token_key(Token.ACCESS, access_token_key, consumer_key)
+        try:
+            return super(FilteredModelStore, self).get_consumer_and_access_token(
+                request, oauth_request, consumer_key, access_token_key)
+        except InvalidTokenError:
+            self._missing.set((Token, Token.ACCESS, consumer_key, access_token_key), True)
+            raise
+
+
+class CacheNonceModelStore(ModelStore):
+    """
+    `ModelStore` recording nonces in the `OAUTH_NONCE_CACHE` Django cache
+    instead of the `Nonce` table.
+
+    Each nonce costs a single atomic `cache.add`, kept until its timestamp
+    is older than `OAUTH_NONCE_VALID_PERIOD`, which must be set. The cache
+    must be shared by all processes and must not evict entries early, or
+    replays get through: the dummy and local memory caches, which culls past
+    `MAX_ENTRIES`, are refused.
+    """
+    def __init__(self):
+        super(CacheNonceModelStore, self).__init__()
+        if not NONCE_VALID_PERIOD:
+            raise ImproperlyConfigured('CacheNonceModelStore requires OAUTH_NONCE_VALID_PERIOD.')
+        if NONCE_CACHE not in settings.CACHES:
+            raise ImproperlyConfigured('OAUTH_NONCE_CACHE "%s" is not defined in CACHES.' % NONCE_CACHE)
+        self._cache = caches[NONCE_CACHE]
+        if isinstance(self._cache, (LocMemCache, DummyCache)):
+            # the dummy cache accepts every nonce, local memory ones are
+            # forgotten under load and unknown to the other processes
+            raise ImproperlyConfigured('OAUTH_NONCE_CACHE "%s" is not shared between processes.' % NONCE_CACHE)
+
+    def _nonce_cache_key(self, consumer_key, token_key, nonce, timestamp):
+        # the parts come from the request, keep the key safe for memcached
+        digest = hashlib.sha1(b'\0'.join(force_bytes(part) for part in (consumer_key, token_key, nonce, timestamp)))
+        return 'oauth_provider:nonce:%s' % digest.hexdigest()
+
+    def check_nonce(self, request, oauth_request, nonce, timestamp=0):
+        timestamp = int(timestamp)
+        # stale timestamps are rejected, so the nonce is only needed until
+        # its timestamp gets stale, which can be later than the valid period
+        # for a timestamp slightly in the future
+        remaining = timestamp + NONCE_VALID_PERIOD - int(time())
+        if remaining < 0:
+            return False
+
+        key = self._nonce_cache_key(oauth_request['oauth_consumer_key'], oauth_request.get('oauth_token', ''),
+                                    nonce, timestamp)
+        return self._cache.add(key, True, remaining + 1)
@@ -2,22 +2,85 @@ from __future__ import absolute_import
 
 import oauth2 as oauth
 from django.conf import settings
+from django.db import IntegrityError, connections, router, transaction
 
 from oauth_provider.compat import now
+from oauth_provider.consts import NONCE_VALID_PERIOD
 from oauth_provider.models import VERIFIER_SIZE, Consumer, Nonce, Scope, Token
+from oauth_provider.signals import tokens_revoked
 from oauth_provider.store import InvalidConsumerError, InvalidTokenError, Store
 
-NONCE_VALID_PERIOD = getattr(settings, "OAUTH_NONCE_VALID_PERIOD", None)
+READ_DATABASE = getattr(settings, 'OAUTH_READ_DATABASE', None)
+
+
+def loaded_objects(request):
+    """
+    Identity map of the consumers and tokens the store already loaded while
+    handling `request`, keyed by `(Consumer, key)` and `(Token, token_type, key)`.
+    """
+    if request is None:
+        return {}
+    try:
+        return request._oauth_provider_objects
+    except AttributeError:
+        objects = request._oauth_provider_objects = {}
+        return objects
+
 
 class ModelStore(Store):
     """
     Store implementation using the Django models defined in `piston.models`.
+
+    Every object it loads is remembered on the Django request, so each row is
+    fetched at most once per request however many times the views ask for it.
+
+    Lookups go to the `OAUTH_READ_DATABASE` replica when it is set, except
+    for request tokens; writes always go to the primary.
     """
+    def _get(self, queryset, **lookup):
+        """
+        `queryset.get(**lookup)` on the replica, retried once on the primary
+        when the row is missing as it may not have been replicated yet.
+        """
+        if READ_DATABASE is None:
+            return queryset.get(**lookup)
+
+        primary = router.db_for_write(queryset.model)
+        try:
+            obj = queryset.using(READ_DATABASE).get(**lookup)
+        except queryset.model.DoesNotExist:
+            return queryset.using(primary).get(**lookup)
+
+        # mark the objects as the primary's, or saving them or relating them
+        # to new rows would be routed to the replica
+        obj._state.db = primary
+        select_related = queryset.query.select_related
+        for name in (select_related if isinstance(select_related, dict) else ()):
+            related = getattr(obj, name)
+            if related is not None:
+                related._state.db = router.db_for_write(related.__class__)
+        return obj
+
+    def _remember_token(self, request, token):
+        objects = loaded_objects(request)
+        objects[Token, token.token_type, token.key] = token
+        # share a single consumer instance between all tokens of the request
+        token.consumer = objects.setdefault((Consumer, token.consumer.key), token.consumer)
+        return token
+
     def get_consumer(self, request, oauth_request, consumer_key):
+        objects = loaded_objects(request)
         try:
-            return Consumer.objects.get(key=consumer_key)
+            return objects[Consumer, consumer_key]
+        except KeyError:
+            pass
+
+        try:
+            consumer = self._get(Consumer.objects.all(), key=consumer_key)
         except Consumer.DoesNotExist:
             raise InvalidConsumerError()
+        objects[Consumer, consumer_key] = consumer
+        return consumer
 
     def get_consumer_for_request_token(self, request, oauth_request, request_token):
         return request_token.consumer
@@ -27,7 +90,7 @@ class ModelStore(Store):
 
     def create_request_token(self, request, oauth_request, consumer, callback):
         try:
-            scope = Scope.objects.get(name=oauth_request.get_parameter('scope'))
+            scope = self._get(Scope.objects.all(), name=oauth_request.get_parameter('scope'))
         except oauth.Error:
             # oauth.Error means that scope wasn't specified
             scope = None
@@ -35,22 +98,35 @@ class ModelStore(Store):
             # Scope.DoesNotExist means that specified scope doesn't exist in db
             raise oauth.Error('Scope does not exist.')
         
-        token = Token.objects.create_token(
+        # validate the callback before anything is written, then INSERT once
+        token = Token.objects.make_token(
             token_type=Token.REQUEST,
-            consumer=Consumer.objects.get(key=oauth_request['oauth_consumer_key']),
+            consumer=consumer,
             timestamp=oauth_request['oauth_timestamp'],
             scope=scope,
         )
-        token.set_callback(callback)
-        token.save()
+        token.set_callback(callback, save=False)
+        token.save(force_insert=True)
 
-        return token
+        return self._remember_token(request, token)
 
     def get_request_token(self, request, oauth_request, request_token_key):
-        try:
-            return Token.objects.get(key=request_token_key, token_type=Token.REQUEST)
-        except Token.DoesNotExist:
+        token = loaded_objects(request).get((Token, Token.REQUEST, request_token_key))
+        if token is None:
+            try:
+                # not from the replica: the token is approved on the primary
+                # right before being exchanged, a lagging replica would still
+                # return it unapproved
+                token = Token.objects.select_related('consumer', 'scope', 'user').using(
+                    router.db_for_write(Token)).get(key=request_token_key, token_type=Token.REQUEST)
+            except Token.DoesNotExist:
+                raise InvalidTokenError()
+            self._remember_token(request, token)
+
+        if token.is_expired():
+            # abandoned flow, left for oauth_purge_request_tokens to delete
             raise InvalidTokenError()
+        return token
 
     def authorize_request_token(self, request, oauth_request, request_token):
         request_token.is_approved = True
@@ -59,23 +135,57 @@ class ModelStore(Store):
         request_token.save()
         return request_token
 
-    def create_access_token(self, request, oauth_request, consumer, request_token):
-        scope = request_token.scope
-        access_token = Token.objects.create_token(
+    def _make_access_token(self, request, oauth_request, consumer, request_token):
+        """Return the unsaved access token `create_access_token` will insert."""
+        return Token.objects.make_token(
             token_type=Token.ACCESS,
             timestamp=oauth_request['oauth_timestamp'],
-            consumer=Consumer.objects.get(key=consumer.key),
+            consumer=consumer,
             user=request_token.user,
-            scope=scope,
+            scope=request_token.scope,
         )
-        request_token.delete()
-        return access_token
+
+    def create_access_token(self, request, oauth_request, consumer, request_token):
+        access_token = self._make_access_token(request, oauth_request, consumer, request_token)
+        access_token.save(force_insert=True)
+        loaded_objects(request).pop((Token, Token.REQUEST, request_token.key), None)
+        # exchanged, not revoked: `Token.delete()` would send tokens_revoked
+        Token._base_manager.using(router.db_for_write(Token)).filter(pk=request_token.pk).delete()
+        return self._remember_token(request, access_token)
 
     def get_access_token(self, request, oauth_request, consumer, access_token_key):
-        try:
-            return Token.objects.get(key=access_token_key, token_type=Token.ACCESS)
-        except Token.DoesNotExist:
+        token = loaded_objects(request).get((Token, Token.ACCESS, access_token_key))
+        if token is None:
+            try:
+                token = self._get(Token.objects.select_related('consumer', 'scope', 'user'),
+                                  key=access_token_key, token_type=Token.ACCESS)
+            except Token.DoesNotExist:
+                raise InvalidTokenError()
+            self._remember_token(request, token)
+
+        if token.is_expired():
+            # left for oauth_purge_access_tokens to delete
+            raise InvalidTokenError()
+        return token
+
+    def get_consumer_and_access_token(self, request, oauth_request, consumer_key, access_token_key):
+        access_token = loaded_objects(request).get((Token, Token.ACCESS, access_token_key))
+        if access_token is None:
+            try:
+                access_token = self._get(Token.objects.select_related('consumer', 'scope', 'user'),
+                                         key=access_token_key, token_type=Token.ACCESS,
+                                         consumer__key=consumer_key)
+            except Token.DoesNotExist:
+                # tell an unknown consumer apart from a bad token
+                self.get_consumer(request, oauth_request, consumer_key)
+                raise InvalidTokenError()
+            self._remember_token(request, access_token)
+        elif access_token.consumer.key != consumer_key:
+            raise InvalidTokenError()
+
+        if access_token.is_expired():
             raise InvalidTokenError()
+        return access_token.consumer, access_token
 
     def get_user_for_access_token(self, request, oauth_request, access_token):
         return access_token.user
@@ -83,15 +193,60 @@ class ModelStore(Store):
     def get_user_for_consumer(self, request, oauth_request, consumer):
         return consumer.user
 
+    def _revoke(self, **lookup):
+        """
+        Delete the tokens matching `lookup`. Nothing references tokens, so
+        without `pre_delete`/`post_delete` receivers for them this is a single
+        DELETE. The base manager does not send `tokens_revoked`, the caller
+        sends it once for the whole revocation.
+        """
+        using = router.db_for_write(Token)
+        deleted, rows_count = Token._base_manager.using(using).filter(**lookup).delete()
+        return deleted
+
+    def revoke_tokens(self, keys):
+        keys = list(keys)
+        using = router.db_for_write(Token)
+        # stay under the number of parameters the database accepts
+        batch_size = connections[using].ops.bulk_batch_size(['key'], keys) or 1
+        count = 0
+        with transaction.atomic(using=using):
+            for start in range(0, len(keys), batch_size):
+                count += self._revoke(key__in=keys[start:start + batch_size])
+        tokens_revoked.send(sender=Token, keys=keys, user=None, consumer=None, count=count)
+        return count
+
+    def revoke_tokens_for_user(self, user):
+        count = self._revoke(user=user)
+        tokens_revoked.send(sender=Token, keys=None, user=user, consumer=None, count=count)
+        return count
+
+    def revoke_tokens_for_consumer(self, consumer):
+        count = self._revoke(consumer=consumer)
+        tokens_revoked.send(sender=Token, keys=None, user=None, consumer=consumer, count=count)
+        return count
+
     def check_nonce(self, request, oauth_request, nonce, timestamp=0):
         timestamp = int(timestamp)
 
         if NONCE_VALID_PERIOD and int(now().strftime("%s")) - timestamp > NONCE_VALID_PERIOD:
             return False
 
-        nonce, created = Nonce.objects.get_or_create(
+        # A single INSERT; the unique constraint on the nonce fields turns a
+        # replay into an IntegrityError instead of needing a SELECT first.
+        nonce = Nonce(
             consumer_key=oauth_request['oauth_consumer_key'],
             token_key=oauth_request.get('oauth_token', ''),
             key=nonce, timestamp=timestamp,
         )
-        return created
+        using = router.db_for_write(Nonce)
+        try:
+            if transaction.get_connection(using).in_atomic_block:
+                # keep a failed INSERT from breaking the surrounding transaction
+                with transaction.atomic(using=using):
+                    nonce.save(force_insert=True, using=using)
+            else:
+                nonce.save(force_insert=True, using=using)
+        except IntegrityError:
+            return False
+        return True
@@ -0,0 +1,261 @@
+from __future__ import absolute_import
+
+import base64
+import binascii
+import random
+import struct
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, router, transaction
+from django.db.models.signals import post_delete
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.encoding import force_bytes, force_text
+
+from oauth_provider.compat import get_user_model
+from oauth_provider.consts import KEY_SIZE, SECRET_SIZE
+from oauth_provider.models import Consumer, Scope, Token
+from oauth_provider.signals import tokens_revoked
+from oauth_provider.store import InvalidTokenError
+from oauth_provider.store.db import ModelStore, loaded_objects
+
+REVOCATION_CACHE = getattr(settings, 'OAUTH_REVOCATION_CACHE', None)
+
+# consumer id, user id, scope id and issue time as unsigned 32 bit integers
+# and 16 random bits telling apart tokens issued in the same second, followed
+# by a 48 bit MAC: 24 bytes, i.e. exactly 32 base64 characters
+PAYLOAD = struct.Struct('>IIIIH')
+MAC_SIZE = 6
+SIGNED_KEY_SIZE = 4 * (PAYLOAD.size + MAC_SIZE) // 3
+
+# primary keys that always fit in the unsigned 32 bit integers of the key
+PACKABLE_PK_TYPES = ('AutoField', 'PositiveIntegerField', 'PositiveSmallIntegerField')
+
+# times a key is drawn again when it is already used
+KEY_ATTEMPTS = 3
+
+KEY_SALT = 'oauth_provider.store.signed.key'
+SECRET_SALT = 'oauth_provider.store.signed.secret'
+
+
+def _revoked_cache_key(key):
+    return 'oauth_provider:revoked:%s' % key
+
+
+def _revoked_before_cache_key(model, pk):
+    # tokens of that user, consumer or scope issued up to then are revoked
+    return 'oauth_provider:revoked-before:%s:%s' % (model, pk)
+
+
+def _revocation_timeout(timestamp, lifetime, now):
+    """
+    Seconds to remember the revocation of a token issued at `timestamp` that
+    is valid for `lifetime` seconds: `None` for ever, 0 if it already expired.
+    """
+    if not lifetime:
+        return None
+    remaining = int(timestamp) + lifetime - now
+    if remaining < 0:
+        return 0
+    # whole minutes, so that revoking many tokens needs few `set_many` calls
+    return (remaining // 60 + 1) * 60
+
+
+class SignedTokenModelStore(ModelStore):
+    """
+    `ModelStore` issuing self-verifying access tokens.
+
+    The key of an access token carries the ids of its consumer, user and scope
+    and its issue time, authenticated with a MAC derived from `SECRET_KEY`;
+    the secret is derived from the key the same way. Access tokens are still
+    saved so they show up in the admin, but verifying one only needs the
+    consumer and a lookup in the `OAUTH_REVOCATION_CACHE` cache. Revoked
+    tokens are recorded there from the `tokens_revoked` signal, along with
+    the time all the tokens of a user or consumer were last revoked or the
+    user, consumer or scope was deleted. That cache must be shared by all
+    processes and must not evict entries before they time out: memcached or
+    Redis without eviction, or the database cache with a `MAX_ENTRIES` above
+    the number of tokens revoked within the access token lifetime. A revocation
+    is remembered until the token expires, for ever when it never does.
+    Changing `SECRET_KEY` invalidates all issued tokens.
+
+    Access tokens issued before this store was enabled are looked up in the
+    database as usual.
+    """
+    def __init__(self):
+        super(SignedTokenModelStore, self).__init__()
+        if KEY_SIZE < SIGNED_KEY_SIZE:
+            raise ImproperlyConfigured('Signed access tokens need OAUTH_PROVIDER_KEY_SIZE >= %d.' % SIGNED_KEY_SIZE)
+        if REVOCATION_CACHE is None:
+            raise ImproperlyConfigured('SignedTokenModelStore requires OAUTH_REVOCATION_CACHE.')
+        if REVOCATION_CACHE not in settings.CACHES:
+            raise ImproperlyConfigured('OAUTH_REVOCATION_CACHE "%s" is not defined in CACHES.' % REVOCATION_CACHE)
+        if isinstance(caches[REVOCATION_CACHE], (LocMemCache, DummyCache)):
+            # revoked tokens would be accepted by the other processes
+            raise ImproperlyConfigured('OAUTH_REVOCATION_CACHE "%s" is not shared between processes.'
+                                       % REVOCATION_CACHE)
+        for model in (Consumer, get_user_model(), Scope):
+            pk_type = model._meta.pk.get_internal_type()
+            if pk_type not in PACKABLE_PK_TYPES:
+                raise ImproperlyConfigured('Signed access tokens cannot carry the %s primary key of %s.'
+                                           % (pk_type, model.__name__))
+        # no receivers for the tokens themselves, they would keep every
+        # revocation or purge from deleting them in a single DELETE
+        tokens_revoked.connect(self._revoke_tokens, sender=Token)
+        # their tokens are deleted by cascade, without `tokens_revoked`
+        post_delete.connect(self._revoke_user_tokens, sender=get_user_model())
+        post_delete.connect(self._revoke_consumer_tokens, sender=Consumer)
+        post_delete.connect(self._revoke_scope_tokens, sender=Scope)
+
+    def _revoke_user_tokens(self, sender, instance, **kwargs):
+        self._revoke_tokens(Token, user=instance)
+
+    def _revoke_consumer_tokens(self, sender, instance, **kwargs):
+        self._revoke_tokens(Token, consumer=instance)
+
+    def _revoke_scope_tokens(self, sender, instance, **kwargs):
+        self._revoke_tokens(Token, scope=instance)
+
+    def _longest_lifetime(self):
+        """
+        The longest access token lifetime of any consumer, `None` for ever and
+        0 when there are no consumers, hence no tokens.
+        """
+        lifetimes = [Consumer(access_token_lifetime=lifetime).get_access_token_lifetime()
+                     for lifetime in Consumer.objects.values_list('access_token_lifetime', flat=True).distinct()]
+        if not all(lifetimes):
+            return None
+        return max(lifetimes) if lifetimes else 0
+
+    def _revoke_tokens(self, sender, keys=None, user=None, consumer=None, scope=None, **kwargs):
+        now = int(time.time())
+        revoked = {}  # timeout: {cache key: value}
+
+        signed_keys = [(key, self._unpack_key(key)) for key in keys or ()]
+        signed_keys = [(key, fields) for key, fields in signed_keys if fields is not None]
+        if signed_keys:
+            consumers = Consumer.objects.only('access_token_lifetime').in_bulk(
+                set(fields[0] for key, fields in signed_keys))
+            for key, (consumer_id, user_id, scope_id, timestamp) in signed_keys:
+                if consumer_id not in consumers:
+                    continue  # tokens of deleted consumers are rejected anyway
+                timeout = _revocation_timeout(timestamp, consumers[consumer_id].get_access_token_lifetime(), now)
+                # expired tokens are rejected anyway
+                if timeout != 0:
+                    revoked.setdefault(timeout, {})[_revoked_cache_key(key)] = True
+
+        # a user or scope may have tokens of any consumer
+        for model, instance in (('user', user), ('scope', scope)):
+            if instance is None:
+                continue
+            lifetime = self._longest_lifetime()
+            if lifetime != 0:
+                timeout = _revocation_timeout(now, lifetime, now)
+                revoked.setdefault(timeout, {})[_revoked_before_cache_key(model, instance.pk)] = now
+        if consumer is not None:
+            timeout = _revocation_timeout(now, consumer.get_access_token_lifetime(), now)
+            revoked.setdefault(timeout, {})[_revoked_before_cache_key('consumer', consumer.pk)] = now
+
+        for timeout, entries in revoked.items():
+            caches[REVOCATION_CACHE].set_many(entries, timeout)
+
+    def _pack_key(self, consumer_id, user_id, scope_id, timestamp):
+        payload = PAYLOAD.pack(consumer_id, user_id or 0, scope_id or 0, timestamp,
+                               random.SystemRandom().getrandbits(16))
+        mac = salted_hmac(KEY_SALT, payload).digest()[:MAC_SIZE]
+        return force_text(base64.urlsafe_b64encode(payload + mac))
+
+    def _unpack_key(self, key):
+        """Return the fields of a signed key, or `None` if it is not one."""
+        if not key or len(key) != SIGNED_KEY_SIZE:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(force_bytes(key))
+        except (TypeError, ValueError, binascii.Error):
+            return None
+        payload, mac = raw[:PAYLOAD.size], raw[PAYLOAD.size:]
+        if not constant_time_compare(mac, salted_hmac(KEY_SALT, payload).digest()[:MAC_SIZE]):
+            return None
+        return PAYLOAD.unpack(payload)[:4]
+
+    def _derive_secret(self, key):
+        digest = salted_hmac(SECRET_SALT, key).digest()
+        return force_text(base64.urlsafe_b64encode(digest))[:SECRET_SIZE]
+
+    def _make_access_token(self, request, oauth_request, consumer, request_token):
+        access_token = super(SignedTokenModelStore, self)._make_access_token(
+            request, oauth_request, consumer, request_token)
+        # the server's clock, not the client's, so revoking all the tokens of
+        # a user or consumer catches the ones issued just before
+        access_token.timestamp = int(time.time())
+        access_token.key = self._pack_key(consumer.pk, request_token.user_id,
+                                          request_token.scope_id, int(access_token.timestamp))
+        access_token.secret = self._derive_secret(access_token.key)
+        return access_token
+
+    def create_access_token(self, request, oauth_request, consumer, request_token):
+        # keys of the same consumer, user and scope issued in the same second
+        # only differ by 16 random bits, draw again when they collide
+        using = router.db_for_write(Token)
+        for attempt in range(KEY_ATTEMPTS):
+            try:
+                with transaction.atomic(using=using):
+                    return super(SignedTokenModelStore, self).create_access_token(
+                        request, oauth_request, consumer, request_token)
+            except IntegrityError:
+                if attempt + 1 == KEY_ATTEMPTS:
+                    raise
+
+    def _get_signed_access_token(self, request, consumer, access_token_key):
+        """
+        Return the access token for a signed key without touching the token
+        table, `None` if the key is not a signed one.
+        """
+        fields = self._unpack_key(access_token_key)
+        if fields is None:
+            return None
+
+        consumer_id, user_id, scope_id, timestamp = fields
+        if consumer_id != consumer.pk:
+            raise InvalidTokenError()
+        revoked_key = _revoked_cache_key(access_token_key)
+        user_key = _revoked_before_cache_key('user', user_id)
+        consumer_key = _revoked_before_cache_key('consumer', consumer_id)
+        scope_key = _revoked_before_cache_key('scope', scope_id)
+        revoked = caches[REVOCATION_CACHE].get_many([revoked_key, user_key, consumer_key, scope_key])
+        if revoked.get(revoked_key):
+            raise InvalidTokenError()
+        # tokens issued in the second of the revocation are revoked too
+        if ((user_id and timestamp <= revoked.get(user_key, -1)) or timestamp <= revoked.get(consumer_key, -1)
+                or (scope_id and timestamp <= revoked.get(scope_key, -1))):
+            raise InvalidTokenError()
+
+        access_token = Token(key=access_token_key, secret=self._derive_secret(access_token_key),
+                             token_type=Token.ACCESS, timestamp=timestamp, is_approved=True,
+                             user_id=user_id or None, scope_id=scope_id or None)
+        access_token.consumer = consumer
+        access_token._state.adding = False
+        if access_token.is_expired():
+            raise InvalidTokenError()
+        return self._remember_token(request, access_token)
+
+    def get_access_token(self, request, oauth_request, consumer, access_token_key):
+        access_token = loaded_objects(request).get((Token, Token.ACCESS, access_token_key))
+        if access_token is None:
+            access_token = self._get_signed_access_token(request, consumer, access_token_key)
+        if access_token is None:
+            access_token = super(SignedTokenModelStore, self).get_access_token(
+                request, oauth_request, consumer, access_token_key)
+        return access_token
+
+    def get_consumer_and_access_token(self, request, oauth_request, consumer_key, access_token_key):
+        if self._unpack_key(access_token_key) is None:
+            return super(SignedTokenModelStore, self).get_consumer_and_access_token(
+                request, oauth_request, consumer_key, access_token_key)
+
+        consumer = self.get_consumer(request, oauth_request, consumer_key)
+        return consumer, self.get_access_token(request, oauth_request, consumer, access_token_key)
@@ -0,0 +1,150 @@
+from __future__ import absolute_import
+
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, close_old_connections, router, transaction
+
+from oauth_provider.consts import NONCE_VALID_PERIOD
+from oauth_provider.models import Nonce
+from oauth_provider.store.db import ModelStore
+
+NONCE_FLUSH_INTERVAL = getattr(settings, 'OAUTH_NONCE_FLUSH_INTERVAL', 0.1)
+NONCE_FLUSH_BATCH_SIZE = getattr(settings, 'OAUTH_NONCE_FLUSH_BATCH_SIZE', 1000)
+
+logger = logging.getLogger(__name__)
+
+
+class NonceWindow(object):
+    """
+    The nonces seen over the last `period` seconds, in one bucket per second
+    of their timestamp so the oldest second is dropped as a whole.
+    """
+    def __init__(self, period):
+        self.period = period
+        self._buckets = {}
+        self._oldest = None
+
+    def _expire(self, now):
+        cutoff = now - self.period
+        if self._oldest is None or cutoff - self._oldest > len(self._buckets):
+            # first use or long idle: cheaper to keep the live buckets
+            self._buckets = dict((second, bucket) for second, bucket in self._buckets.items() if second >= cutoff)
+        else:
+            for second in range(self._oldest, cutoff):
+                self._buckets.pop(second, None)
+        self._oldest = cutoff if self._oldest is None else max(cutoff, self._oldest)
+
+    def add(self, item, timestamp, now):
+        """
+        Record `item` seen at `timestamp`; return False when it was already
+        recorded or `timestamp` is outside the window.
+        """
+        self._expire(now)
+        if timestamp < self._oldest:
+            return False
+        bucket = self._buckets.setdefault(timestamp, set())
+        if item in bucket:
+            return False
+        bucket.add(item)
+        return True
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self._buckets.values())
+
+
+class WriteBehindNonceModelStore(ModelStore):
+    """
+    `ModelStore` checking nonces in memory and saving them in the background.
+
+    Replays are caught against the nonces this process saw during the last
+    `OAUTH_NONCE_VALID_PERIOD` seconds, which must be set; the window is
+    filled from the database on first use so a restart does not reopen it.
+    New nonces are saved with `bulk_create` every `OAUTH_NONCE_FLUSH_INTERVAL`
+    seconds by a daemon thread, or only when `flush()` is called if it is 0.
+
+    With several processes a nonce replayed to another process is not
+    rejected; it is only logged when that process saves it and hits the
+    unique constraint. Route all requests of a consumer to the same process
+    or use a store sharing nonces between processes when that matters.
+    Nonces not yet saved are lost if the process is killed.
+    """
+    flush_interval = NONCE_FLUSH_INTERVAL
+
+    def __init__(self):
+        super(WriteBehindNonceModelStore, self).__init__()
+        if not NONCE_VALID_PERIOD:
+            raise ImproperlyConfigured('WriteBehindNonceModelStore requires OAUTH_NONCE_VALID_PERIOD.')
+        self._window = NonceWindow(NONCE_VALID_PERIOD)
+        self._loaded = False
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def _load_recent_nonces(self, now):
+        nonces = Nonce.objects.filter(timestamp__gte=now - NONCE_VALID_PERIOD).values_list(
+            'consumer_key', 'token_key', 'key', 'timestamp')
+        for consumer_key, token_key, key, timestamp in nonces.iterator():
+            self._window.add((consumer_key, token_key, key), timestamp, now)
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_periodically, name='oauth-nonce-flusher')
+            self._flusher.daemon = True
+            self._flusher.start()
+        atexit.register(self.flush)
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Could not save nonces.')
+            finally:
+                close_old_connections()
+
+    def check_nonce(self, request, oauth_request, nonce, timestamp=0):
+        timestamp = int(timestamp)
+        now = int(time.time())
+        consumer_key, token_key = oauth_request['oauth_consumer_key'], oauth_request.get('oauth_token', '')
+
+        with self._lock:
+            if not self._loaded:
+                self._load_recent_nonces(now)
+                self._loaded = True
+            if not self._window.add((consumer_key, token_key, nonce), timestamp, now):
+                return False
+            self._pending.append(Nonce(consumer_key=consumer_key, token_key=token_key, key=nonce, timestamp=timestamp))
+
+        if self.flush_interval and self._flusher is None:
+            self._start_flusher()
+        return True
+
+    def flush(self):
+        """Save the nonces checked since the last flush, return how many."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        using = router.db_for_write(Nonce)
+        for start in range(0, len(pending), NONCE_FLUSH_BATCH_SIZE):
+            batch = pending[start:start + NONCE_FLUSH_BATCH_SIZE]
+            try:
+                with transaction.atomic(using=using):
+                    Nonce.objects.using(using).bulk_create(batch)
+            except IntegrityError:
+                # some were used on another process too, save the others
+                for nonce in batch:
+                    try:
+                        with transaction.atomic(using=using):
+                            nonce.save(force_insert=True, using=using)
+                    except IntegrityError:
+                        logger.warning('Nonce %r of consumer %r was replayed to another process.',
+                                       nonce.key, nonce.consumer_key)
+        return len(pending)
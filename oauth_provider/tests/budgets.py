@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import time
+from contextlib import contextmanager
+
+import mock
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from six.moves.urllib.parse import parse_qs, urlparse
+
+from oauth_provider.models import Scope
+from oauth_provider.tests.auth import BaseOAuthTestCase
+
+# Most SQL statements each flow may run, savepoints included. Lower them when
+# a change saves queries; raising one needs a good reason.
+QUERY_BUDGETS = {
+    'request_token': 6,
+    'authorize_get': 6,
+    'authorize_post': 7,
+    'access_token': 7,
+    'xauth_access_token': 10,
+    'protected_resource': 4,
+}
+
+
+class QueryBudgetTest(BaseOAuthTestCase):
+    @contextmanager
+    def assertQueryBudget(self, flow):
+        budget = QUERY_BUDGETS[flow]
+        with CaptureQueriesContext(connection) as queries:
+            yield
+        executed = [query['sql'] for query in queries.captured_queries]
+        if len(executed) > budget:
+            # mark the statements over budget like the added lines of a diff
+            lines = ['%s %d. %s' % (' ' if i < budget else '+', i + 1, sql) for i, sql in enumerate(executed)]
+            self.fail('%s ran %d queries, its budget is %d:\n%s' % (flow, len(executed), budget, '\n'.join(lines)))
+
+    def _oauth_parameters(self, **parameters):
+        result = {
+            'oauth_consumer_key': self.CONSUMER_KEY,
+            'oauth_signature_method': 'PLAINTEXT',
+            'oauth_signature': '%s&' % self.CONSUMER_SECRET,
+            'oauth_timestamp': str(int(time.time())),
+            'oauth_nonce': 'budgetnonce',
+            'oauth_version': '1.0',
+        }
+        result.update(parameters)
+        return result
+
+    def test_three_legged_flow(self):
+        with self.assertQueryBudget('request_token'):
+            response = self.c.get("/oauth/request_token/", self._oauth_parameters(
+                oauth_callback=self.callback, scope=self.scope.name))
+        self.assertEqual(response.status_code, 200)
+        request_token = parse_qs(response.content.decode('utf-8'))
+        token_key, token_secret = request_token['oauth_token'][0], request_token['oauth_token_secret'][0]
+
+        self.c.login(username=self.username, password=self.password)
+        with self.assertQueryBudget('authorize_get'):
+            response = self.c.get("/oauth/authorize/", {'oauth_token': token_key})
+        self.assertEqual(response.status_code, 200)
+        with self.assertQueryBudget('authorize_post'):
+            response = self.c.post("/oauth/authorize/", {'oauth_token': token_key, 'authorize_access': 1})
+        self.assertEqual(response.status_code, 302)
+        verifier = parse_qs(urlparse(response['Location']).query)['oauth_verifier'][0]
+        self.c.logout()
+
+        with self.assertQueryBudget('access_token'):
+            response = self.c.get("/oauth/access_token/", self._oauth_parameters(
+                oauth_token=token_key, oauth_verifier=verifier,
+                oauth_signature='%s&%s' % (self.CONSUMER_SECRET, token_secret)))
+        self.assertEqual(response.status_code, 200)
+        access_token = parse_qs(response.content.decode('utf-8'))
+
+        with self.assertQueryBudget('protected_resource'):
+            response = self.c.get("/oauth/photo/", self._oauth_parameters(
+                oauth_token=access_token['oauth_token'][0], oauth_nonce='photononce',
+                oauth_signature='%s&%s' % (self.CONSUMER_SECRET, access_token['oauth_token_secret'][0])))
+        self.assertEqual(response.status_code, 200)
+
+    def test_xauth_flow(self):
+        self.consumer.xauth_allowed = True
+        self.consumer.save()
+
+        with self.assertQueryBudget('xauth_access_token'):
+            response = self.c.get("/oauth/access_token/", self._oauth_parameters(
+                x_auth_mode='client_auth', x_auth_username=self.username, x_auth_password=self.password))
+        self.assertEqual(response.status_code, 200)
+
+    @mock.patch.dict(QUERY_BUDGETS, {'request_token': 1})
+    def test_over_budget_lists_queries(self):
+        with self.assertRaises(AssertionError) as context:
+            with self.assertQueryBudget('request_token'):
+                list(Scope.objects.all())
+                list(Scope.objects.filter(name='photos'))
+
+        message = str(context.exception).splitlines()
+        self.assertEqual(message[0], 'request_token ran 2 queries, its budget is 1:')
+        self.assertTrue(message[1].startswith('  1. SELECT'))
+        self.assertTrue(message[2].startswith('+ 2. SELECT'))
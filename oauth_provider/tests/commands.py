@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import time
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from six import StringIO
+
+from oauth_provider.models import Consumer, Nonce, Token
+
+
+class PurgeNoncesTest(TestCase):
+    def setUp(self):
+        now = int(time.time())
+        for i in range(5):
+            Nonce.objects.create(consumer_key='consumer', token_key='', key='old%d' % i, timestamp=now - 1000)
+        Nonce.objects.create(consumer_key='consumer', token_key='', key='fresh', timestamp=now)
+
+    def test_delete_expired(self):
+        result = Nonce.objects.delete_expired(valid_period=120, batch_size=2)
+
+        self.assertEqual(result.deleted, 5)
+        self.assertEqual(list(Nonce.objects.values_list('key', flat=True)), ['fresh'])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('oauth_purge_nonces', max_age=120, batch_size=2, stdout=out)
+
+        self.assertTrue(out.getvalue().startswith('Deleted 5 expired nonces in '))
+        self.assertEqual(Nonce.objects.count(), 1)
+
+    def test_command_requires_max_age(self):
+        self.assertRaises(CommandError, call_command, 'oauth_purge_nonces', max_age=0)
+
+
+class PurgeRequestTokensTest(TestCase):
+    def setUp(self):
+        now = int(time.time())
+        consumer = Consumer.objects.create(key='consumerkey', secret='secret', name='consumer')
+        for i in range(3):
+            Token.objects.create_token(consumer=consumer, token_type=Token.REQUEST, timestamp=now - 3600, scope=None)
+        self.fresh = Token.objects.create_token(consumer=consumer, token_type=Token.REQUEST, timestamp=now, scope=None)
+        self.access = Token.objects.create_token(consumer=consumer, token_type=Token.ACCESS, timestamp=now - 3600,
+                                                 scope=None)
+
+    def test_delete_expired_request_tokens(self):
+        result = Token.objects.delete_expired_request_tokens(lifetime=600, batch_size=2)
+
+        self.assertEqual(result.deleted, 3)
+        self.assertEqual(sorted(Token.objects.values_list('pk', flat=True)), [self.fresh.pk, self.access.pk])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('oauth_purge_request_tokens', max_age=600, stdout=out)
+
+        self.assertTrue(out.getvalue().startswith('Deleted 3 expired request tokens in '))
+
+    def test_command_requires_max_age(self):
+        self.assertRaises(CommandError, call_command, 'oauth_purge_request_tokens')
+
+
+class PurgeAccessTokensTest(TestCase):
+    def setUp(self):
+        now = int(time.time())
+        consumer = Consumer.objects.create(key='consumerkey', secret='secret', name='consumer')
+        short_lived = Consumer.objects.create(key='shortkey', secret='secret', name='short',
+                                              access_token_lifetime=60)
+        self.old = Token.objects.create_token(consumer=consumer, token_type=Token.ACCESS,
+                                              timestamp=now - 3600, scope=None)
+        self.recent = Token.objects.create_token(consumer=consumer, token_type=Token.ACCESS,
+                                                 timestamp=now - 120, scope=None)
+        self.short_recent = Token.objects.create_token(consumer=short_lived, token_type=Token.ACCESS,
+                                                       timestamp=now - 120, scope=None)
+
+    def _remaining(self):
+        return sorted(Token.objects.values_list('pk', flat=True))
+
+    def test_consumer_lifetime_only(self):
+        result = Token.objects.delete_expired_access_tokens()
+
+        self.assertEqual(result.deleted, 1)
+        self.assertEqual(self._remaining(), [self.old.pk, self.recent.pk])
+
+    def test_default_lifetime(self):
+        result = Token.objects.delete_expired_access_tokens(lifetime=600, batch_size=1)
+
+        self.assertEqual(result.deleted, 2)
+        self.assertEqual(self._remaining(), [self.recent.pk])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('oauth_purge_access_tokens', max_age=600, stdout=out)
+
+        self.assertTrue(out.getvalue().startswith('Deleted 2 expired access tokens in '))
+        self.assertIn('tokens/s', out.getvalue())
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import time
+
+import oauth2 as oauth
+from django.test import TestCase
+
+from oauth_provider.models import Consumer, Token
+from oauth_provider.store.db import ModelStore
+
+
+class TokenManagerTest(TestCase):
+    def setUp(self):
+        self.consumer = Consumer.objects.create(key='consumerkey', secret='secret', name='consumer')
+        self.timestamp = int(time.time())
+
+    def test_create_token_single_insert(self):
+        with self.assertNumQueries(1):
+            token = Token.objects.create_token(self.consumer, Token.REQUEST, self.timestamp, None)
+
+        self.assertEqual(len(token.key), 32)
+        self.assertTrue(token.secret)
+        self.assertEqual(Token.objects.get(key=token.key).secret, token.secret)
+
+    def test_create_token_always_creates(self):
+        first = Token.objects.create_token(self.consumer, Token.REQUEST, self.timestamp, None)
+        second = Token.objects.create_token(self.consumer, Token.REQUEST, self.timestamp, None)
+        self.assertNotEqual(first.key, second.key)
+
+    def test_bulk_create_tokens(self):
+        with self.assertNumQueries(1):
+            Token.objects.bulk_create_tokens(
+                dict(consumer=self.consumer, token_type=Token.ACCESS, timestamp=self.timestamp, scope=None)
+                for i in range(10))
+
+        self.assertEqual(len(set(Token.objects.values_list('key', flat=True))), 10)
+
+    def test_create_request_token_with_invalid_callback(self):
+        oauth_request = oauth.Request(parameters={
+            'oauth_consumer_key': 'consumerkey', 'oauth_timestamp': str(self.timestamp)})
+
+        self.assertRaises(oauth.Error, ModelStore().create_request_token,
+                          None, oauth_request, self.consumer, 'not a callback')
+        self.assertFalse(Token.objects.exists())
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import time
+
+import mock
+from django.conf import settings
+from django.http import HttpResponse
+from django.test.utils import override_settings
+from django.test.client import RequestFactory
+
+from oauth_provider.decorators import oauth_required
+from oauth_provider.middleware import OAuthAuthenticationMiddleware
+from oauth_provider.ratelimit import rate_limiter
+from oauth_provider.tests.auth import BaseOAuthTestCase
+
+
+@oauth_required
+def protected_view(request):
+    return HttpResponse()
+
+
+@oauth_required
+@oauth_required("photos")
+def doubly_protected_view(request):
+    return HttpResponse()
+
+
+class OAuthAuthenticationMiddlewareTest(BaseOAuthTestCase):
+    def setUp(self):
+        super(OAuthAuthenticationMiddlewareTest, self).setUp()
+        self._request_token(scope=self.scope.name)
+        self._authorize_and_access_token_using_form()
+        self.middleware = OAuthAuthenticationMiddleware()
+
+    def _signed_request(self, **parameters_overriden):
+        parameters = {
+            'oauth_consumer_key': self.CONSUMER_KEY,
+            'oauth_signature_method': "PLAINTEXT",
+            'oauth_version': "1.0",
+            'oauth_token': self.ACCESS_TOKEN_KEY,
+            'oauth_timestamp': str(int(time.time())),
+            'oauth_nonce': str(int(time.time())) + "nonce",
+            'oauth_signature': "%s&%s" % (self.CONSUMER_SECRET, self.ACCESS_TOKEN_SECRET),
+        }
+        parameters.update(parameters_overriden)
+        return RequestFactory().get("/oauth/photo/", parameters)
+
+    def test_authenticated_request(self):
+        request = self._signed_request()
+        self.middleware.process_view(request, protected_view, (), {})
+
+        self.assertEqual(request.oauth_consumer, self.consumer)
+        self.assertEqual(request.oauth_token.key, self.ACCESS_TOKEN_KEY)
+        self.assertIsNone(request.oauth_error)
+        self.assertEqual(request.user, self.jane)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(doubly_protected_view(request).status_code, 200)
+            self.assertEqual(protected_view(request).status_code, 200)
+
+    def test_unauthenticated_request(self):
+        request = self._signed_request(oauth_signature='wrong')
+        self.middleware.process_view(request, protected_view, (), {})
+
+        self.assertIsNone(request.oauth_consumer)
+        self.assertIsNone(request.oauth_token)
+        self.assertEqual(protected_view(request).status_code, 401)
+
+    def test_request_without_oauth(self):
+        request = RequestFactory().get("/oauth/photo/")
+        with self.assertNumQueries(0):
+            self.middleware.process_view(request, protected_view, (), {})
+
+        self.assertIsNone(request.oauth_token)
+        self.assertEqual(protected_view(request).status_code, 401)
+
+    def test_nested_decorators_without_middleware(self):
+        # each decorator authenticates on its own, the second one then sees
+        # the nonce being replayed
+        self.assertEqual(doubly_protected_view(self._signed_request()).status_code, 401)
+
+
+@override_settings(MIDDLEWARE_CLASSES=settings.MIDDLEWARE_CLASSES + (
+    'oauth_provider.middleware.OAuthAuthenticationMiddleware',))
+@mock.patch('oauth_provider.ratelimit.CONSUMER_RATE_LIMIT', (100, 60))
+@mock.patch('oauth_provider.ratelimit.TOKEN_RATE_LIMIT', (100, 60))
+class OAuthAuthenticationMiddlewareTokenViewsTest(BaseOAuthTestCase):
+    def setUp(self):
+        super(OAuthAuthenticationMiddlewareTokenViewsTest, self).setUp()
+        rate_limiter.cache.clear()
+        patcher = mock.patch.object(rate_limiter, 'consume', side_effect=rate_limiter.consume)
+        self.consume = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _buckets(self):
+        buckets = [args[0] for args, kwargs in self.consume.call_args_list]
+        self.consume.reset_mock()
+        return buckets
+
+    def test_token_views_are_skipped(self):
+        self._request_token()
+        self.assertEqual(self._buckets(), ['consumer'])
+
+        self._authorize_and_access_token_using_form()
+        self.assertEqual(self._buckets(), ['consumer', 'token'])
+
+        response = self.c.get("/oauth/photo/", {
+            'oauth_consumer_key': self.CONSUMER_KEY,
+            'oauth_signature_method': "PLAINTEXT",
+            'oauth_version': "1.0",
+            'oauth_token': self.ACCESS_TOKEN_KEY,
+            'oauth_timestamp': str(int(time.time())),
+            'oauth_nonce': "photononce",
+            'oauth_signature': "%s&%s" % (self.CONSUMER_SECRET, self.ACCESS_TOKEN_SECRET),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._buckets(), ['consumer', 'token'])
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import time
+
+from oauth_provider.tests.auth import BaseOAuthTestCase
+
+
+class PrevalidationTest(BaseOAuthTestCase):
+    def _request_token_parameters(self, **parameters_overriden):
+        parameters = {
+            'oauth_consumer_key': self.CONSUMER_KEY,
+            'oauth_signature_method': 'PLAINTEXT',
+            'oauth_signature': '%s&' % self.CONSUMER_SECRET,
+            'oauth_timestamp': str(int(time.time())),
+            'oauth_nonce': 'requestnonce',
+            'oauth_version': '1.0',
+            'oauth_callback': self.callback,
+        }
+        parameters.update(parameters_overriden)
+        return parameters
+
+    def _assert_rejected_without_queries(self, url, parameters, status_code):
+        with self.assertNumQueries(0):
+            response = self.c.get(url, parameters)
+        self.assertEqual(response.status_code, status_code)
+        return response
+
+    def test_missing_parameters(self):
+        parameters = self._request_token_parameters()
+        del parameters['oauth_nonce']
+        response = self._assert_rejected_without_queries("/oauth/request_token/", parameters, 400)
+        self.assertEqual(response.content, b'Missing OAuth parameters: oauth_nonce')
+
+    def test_unsupported_signature_method(self):
+        parameters = self._request_token_parameters(oauth_signature_method='RSA-SHA512')
+        self._assert_rejected_without_queries("/oauth/request_token/", parameters, 400)
+
+    def test_rejected_values_are_not_served_as_html(self):
+        for name in ('oauth_signature_method', 'oauth_timestamp'):
+            parameters = self._request_token_parameters(**{name: '<script>alert(1)</script>'})
+            response = self._assert_rejected_without_queries("/oauth/request_token/", parameters, 400)
+            self.assertEqual(response['Content-Type'], 'text/plain')
+
+    def test_stale_timestamp(self):
+        parameters = self._request_token_parameters(oauth_timestamp=str(int(time.time()) - 3600))
+        self._assert_rejected_without_queries("/oauth/request_token/", parameters, 401)
+
+    def test_future_timestamp(self):
+        parameters = self._request_token_parameters(oauth_timestamp=str(int(time.time()) + 3600))
+        self._assert_rejected_without_queries("/oauth/request_token/", parameters, 401)
+
+    def test_invalid_timestamp(self):
+        parameters = self._request_token_parameters(oauth_timestamp='yesterday')
+        self._assert_rejected_without_queries("/oauth/request_token/", parameters, 400)
+
+    def test_unsupported_version(self):
+        parameters = self._request_token_parameters(oauth_version='2.0')
+        self._assert_rejected_without_queries("/oauth/request_token/", parameters, 401)
+
+    def test_access_token_checked_before_consumer(self):
+        parameters = self._request_token_parameters(oauth_consumer_key='unknown')
+        del parameters['oauth_callback']
+        response = self._assert_rejected_without_queries("/oauth/access_token/", parameters, 400)
+        self.assertEqual(response.content, b'Missing OAuth parameters: oauth_token, oauth_verifier')
+
+    def test_protected_resource_without_token(self):
+        parameters = self._request_token_parameters()
+        del parameters['oauth_callback']
+        response = self._assert_rejected_without_queries("/oauth/photo/", parameters, 400)
+        self.assertEqual(response.content, b'Missing OAuth parameters: oauth_token')
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import time
+
+import mock
+from django.test import TestCase
+
+from oauth_provider.ratelimit import CacheRateLimiter, rate_limiter
+from oauth_provider.tests.auth import BaseOAuthTestCase
+
+
+class CacheRateLimiterTest(TestCase):
+    def setUp(self):
+        self.limiter = CacheRateLimiter()
+        self.limiter.cache.clear()
+
+    def test_burst_then_wait(self):
+        self.assertEqual(self.limiter.consume('consumer', 'key', (2, 60)), 0)
+        self.assertEqual(self.limiter.consume('consumer', 'key', (2, 60)), 0)
+        retry_after = self.limiter.consume('consumer', 'key', (2, 60))
+        self.assertTrue(0 < retry_after <= 30)
+
+    def test_buckets_are_separate(self):
+        self.limiter.consume('consumer', 'key', (1, 60))
+        self.assertEqual(self.limiter.consume('consumer', 'otherkey', (1, 60)), 0)
+        self.assertEqual(self.limiter.consume('token', 'key', (1, 60)), 0)
+
+
+class RateLimitedViewsTest(BaseOAuthTestCase):
+    def setUp(self):
+        super(RateLimitedViewsTest, self).setUp()
+        rate_limiter.cache.clear()
+
+    def _request_token_parameters(self, nonce):
+        return {
+            'oauth_consumer_key': self.CONSUMER_KEY,
+            'oauth_signature_method': 'PLAINTEXT',
+            'oauth_signature': '%s&' % self.CONSUMER_SECRET,
+            'oauth_timestamp': str(int(time.time())),
+            'oauth_nonce': nonce,
+            'oauth_version': '1.0',
+            'oauth_callback': self.callback,
+        }
+
+    @mock.patch('oauth_provider.ratelimit.CONSUMER_RATE_LIMIT', (1, 60))
+    def test_consumer_over_limit(self):
+        response = self.c.get("/oauth/request_token/", self._request_token_parameters('nonce1'))
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.c.get("/oauth/request_token/", self._request_token_parameters('nonce2'))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+
+    @mock.patch('oauth_provider.ratelimit.TOKEN_RATE_LIMIT', (1, 60))
+    def test_token_over_limit(self):
+        self._request_token()
+        self._authorize_and_access_token_using_form()
+        parameters = {
+            'oauth_consumer_key': self.CONSUMER_KEY,
+            'oauth_token': self.ACCESS_TOKEN_KEY,
+            'oauth_signature_method': 'PLAINTEXT',
+            'oauth_signature': '%s&%s' % (self.CONSUMER_SECRET, self.ACCESS_TOKEN_SECRET),
+            'oauth_timestamp': str(int(time.time())),
+            'oauth_version': '1.0',
+        }
+
+        response = self.c.get("/oauth/none/", dict(parameters, oauth_nonce='nonce1'))
+        self.assertEqual(response.status_code, 200)
+        response = self.c.get("/oauth/none/", dict(parameters, oauth_nonce='nonce2'))
+        self.assertEqual(response.status_code, 429)
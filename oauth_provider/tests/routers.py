@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import mock
+from django.test import TestCase
+
+from oauth_provider.models import Nonce, Token
+from oauth_provider.routers import NonceRouter
+
+
+class NonceRouterTest(TestCase):
+    def setUp(self):
+        self.router = NonceRouter()
+
+    @mock.patch('oauth_provider.routers.NONCE_DATABASE', 'nonces')
+    def test_nonces_use_their_database(self):
+        self.assertEqual(self.router.db_for_read(Nonce), 'nonces')
+        self.assertEqual(self.router.db_for_write(Nonce), 'nonces')
+        self.assertIsNone(self.router.db_for_write(Token))
+
+    @mock.patch('oauth_provider.routers.NONCE_DATABASE', 'nonces')
+    def test_migrations(self):
+        self.assertTrue(self.router.allow_migrate('nonces', 'oauth_provider', 'nonce'))
+        self.assertFalse(self.router.allow_migrate('default', 'oauth_provider', 'nonce'))
+        self.assertFalse(self.router.allow_migrate('nonces', 'oauth_provider', 'token'))
+        self.assertIsNone(self.router.allow_migrate('default', 'oauth_provider', 'token'))
+        self.assertIsNone(self.router.allow_migrate('nonces', 'auth', 'user'))
+
+    def test_not_configured(self):
+        self.assertIsNone(self.router.db_for_write(Nonce))
+        self.assertIsNone(self.router.allow_migrate('default', 'oauth_provider', 'nonce'))
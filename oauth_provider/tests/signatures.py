@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import base64
+import time
+from unittest import skipUnless
+
+import oauth2 as oauth
+from django.test import TestCase
+
+from oauth_provider.models import Consumer
+from oauth_provider.signature_methods import (SignatureMethod_HMAC_SHA256,
+                                              SignatureMethod_RSA_SHA1,
+                                              load_rsa_public_key)
+from oauth_provider.tests.auth import BaseOAuthTestCase
+from oauth_provider.utils import SignatureMethodRegistry, signature_method_registry
+
+
+class SignatureMethodRegistryTest(TestCase):
+    def setUp(self):
+        self.consumer = oauth.Consumer('consumerkey', 'consumersecret')
+        self.registry = SignatureMethodRegistry(['plaintext', 'HMAC-SHA1'])
+        self.registry.register(oauth.SignatureMethod_PLAINTEXT())
+        self.registry.register(oauth.SignatureMethod_HMAC_SHA1())
+
+    def _signed_request(self, signature_method):
+        oauth_request = oauth.Request.from_consumer_and_token(
+            self.consumer, http_method='GET', http_url='http://testserver/oauth/photo/',
+            parameters={'oauth_timestamp': str(int(time.time())), 'oauth_nonce': 'nonce'})
+        oauth_request.sign_request(signature_method, self.consumer, None)
+        return oauth_request
+
+    def test_server_is_shared(self):
+        self.assertIs(self.registry.server, self.registry.server)
+        self.assertEqual(sorted(self.registry.server.signature_methods), ['HMAC-SHA1', 'PLAINTEXT'])
+
+    def test_only_enabled_methods_are_used(self):
+        registry = SignatureMethodRegistry(['plaintext'])
+        registry.register(oauth.SignatureMethod_PLAINTEXT())
+        registry.register(oauth.SignatureMethod_HMAC_SHA1())
+
+        self.assertRaises(oauth.Error, registry.verify_request,
+                          self._signed_request(oauth.SignatureMethod_HMAC_SHA1()), self.consumer)
+
+    def test_register_replaces_server(self):
+        server = self.registry.server
+
+        class SignatureMethod_UPPER_PLAINTEXT(oauth.SignatureMethod_PLAINTEXT):
+            name = 'UPPER-PLAINTEXT'
+
+        self.registry.enabled.add('upper-plaintext')
+        self.registry.register(SignatureMethod_UPPER_PLAINTEXT())
+
+        self.assertIsNot(self.registry.server, server)
+        self.registry.verify_request(self._signed_request(SignatureMethod_UPPER_PLAINTEXT()), self.consumer)
+
+    def test_timing_hook(self):
+        calls = []
+        hook = lambda name, elapsed, verified: calls.append((name, verified))
+        self.registry.add_timing_hook(hook)
+
+        self.registry.verify_request(self._signed_request(oauth.SignatureMethod_HMAC_SHA1()), self.consumer)
+        oauth_request = self._signed_request(oauth.SignatureMethod_PLAINTEXT())
+        oauth_request['oauth_signature'] = 'wrong'
+        self.assertRaises(oauth.Error, self.registry.verify_request, oauth_request, self.consumer)
+        self.registry.remove_timing_hook(hook)
+        self.registry.verify_request(self._signed_request(oauth.SignatureMethod_HMAC_SHA1()), self.consumer)
+
+        self.assertEqual(calls, [('HMAC-SHA1', True), ('PLAINTEXT', False)])
+
+    def test_default_registry(self):
+        # only the methods enabled in OAUTH_SIGNATURE_METHODS are used
+        self.assertEqual(sorted(signature_method_registry.server.signature_methods), ['HMAC-SHA1', 'PLAINTEXT'])
+
+
+class HMACSHA256SignatureTest(TestCase):
+    def setUp(self):
+        self.consumer = oauth.Consumer('consumerkey', 'consumersecret')
+        self.token = oauth.Token('tokenkey', 'tokensecret')
+        self.registry = SignatureMethodRegistry(['hmac-sha256'])
+        self.registry.register(SignatureMethod_HMAC_SHA256())
+        self.oauth_request = oauth.Request.from_consumer_and_token(
+            self.consumer, self.token, http_method='GET', http_url='http://testserver/oauth/photo/')
+        self.oauth_request.sign_request(SignatureMethod_HMAC_SHA256(), self.consumer, self.token)
+
+    def test_valid_signature(self):
+        self.registry.verify_request(self.oauth_request, self.consumer, self.token)
+
+    def test_wrong_secret(self):
+        token = oauth.Token('tokenkey', 'othersecret')
+        self.assertRaises(oauth.Error, self.registry.verify_request, self.oauth_request, self.consumer, token)
+
+
+@skipUnless(SignatureMethod_RSA_SHA1.available, 'cryptography is not installed')
+class RSASHA1SignatureTest(TestCase):
+    def setUp(self):
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        self.private_key = rsa.generate_private_key(65537, 2048, default_backend())
+        pem = self.private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+        self.consumer = oauth.Consumer('consumerkey', '')
+        self.consumer.rsa_public_key = pem.decode('ascii')
+        self.registry = SignatureMethodRegistry(['rsa-sha1'])
+        self.registry.register(SignatureMethod_RSA_SHA1())
+
+    def _signed_request(self):
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+
+        oauth_request = oauth.Request.from_consumer_and_token(
+            self.consumer, http_method='GET', http_url='http://testserver/oauth/photo/',
+            parameters={'oauth_signature_method': 'RSA-SHA1'})
+        key, raw = SignatureMethod_RSA_SHA1().signing_base(oauth_request, self.consumer, None)
+        signature = self.private_key.sign(raw, padding.PKCS1v15(), hashes.SHA1())
+        oauth_request['oauth_signature'] = base64.b64encode(signature).decode('ascii')
+        return oauth_request
+
+    def test_valid_signature(self):
+        self.registry.verify_request(self._signed_request(), self.consumer)
+
+    def test_invalid_signature(self):
+        oauth_request = self._signed_request()
+        oauth_request['oauth_timestamp'] = str(int(oauth_request['oauth_timestamp']) - 1)
+        self.assertRaises(oauth.Error, self.registry.verify_request, oauth_request, self.consumer)
+
+    def test_consumer_without_key(self):
+        oauth_request = self._signed_request()
+        self.consumer.rsa_public_key = ''
+        self.assertRaises(oauth.Error, self.registry.verify_request, oauth_request, self.consumer)
+
+    def test_public_key_is_parsed_once(self):
+        pem = self.consumer.rsa_public_key
+        self.assertIs(load_rsa_public_key(pem), load_rsa_public_key(pem))
+        self.assertIsNone(load_rsa_public_key('not a key'))
+
+
+class SharedSecretSignatureTest(BaseOAuthTestCase):
+    def _request_token(self, consumer_key, secret):
+        return self.c.get("/oauth/request_token/", {
+            'oauth_consumer_key': consumer_key,
+            'oauth_signature_method': 'PLAINTEXT',
+            'oauth_signature': '%s&' % secret,
+            'oauth_timestamp': str(int(time.time())),
+            'oauth_nonce': 'sharedsecretnonce',
+            'oauth_version': '1.0',
+            'oauth_callback': self.callback,
+        })
+
+    def test_rsa_consumer(self):
+        Consumer.objects.filter(pk=self.consumer.pk).update(rsa_public_key='-----BEGIN PUBLIC KEY-----')
+        self.assertEqual(self._request_token(self.CONSUMER_KEY, self.CONSUMER_SECRET).status_code, 401)
+
+    def test_blank_secret(self):
+        Consumer.objects.create(key='blanksecret', secret='', name='blank', user=self.jane)
+        self.assertEqual(self._request_token('blanksecret', '').status_code, 401)
@@ -0,0 +1,610 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import time
+from contextlib import contextmanager
+
+import mock
+import oauth2 as oauth
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.test.client import RequestFactory
+
+from oauth_provider.compat import get_user_model
+from oauth_provider.models import Consumer, Nonce, Scope, Token
+from oauth_provider.signals import tokens_revoked
+from oauth_provider.store import InvalidConsumerError, InvalidTokenError
+from oauth_provider.store.cached import (BloomFilter, CacheNonceModelStore, CachedConsumerModelStore,
+                                        FilteredModelStore, LRUCache)
+from oauth_provider.store.db import ModelStore
+from oauth_provider.store.signed import REVOCATION_CACHE, SignedTokenModelStore, _revoked_cache_key
+from oauth_provider.store.writebehind import NonceWindow, WriteBehindNonceModelStore
+
+
+class LRUCacheTest(TestCase):
+    def test_least_recently_used_entry_is_dropped(self):
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_expired_entry_is_missing(self):
+        cache = LRUCache(max_size=2, timeout=-1)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+
+class CachedConsumerModelStoreTest(TestCase):
+    def setUp(self):
+        self.consumer = Consumer.objects.create(key='cachedkey', secret='secret', name='cached')
+        self.store = CachedConsumerModelStore()
+
+    def test_consumer_is_cached(self):
+        with self.assertNumQueries(1):
+            self.store.get_consumer(None, None, 'cachedkey')
+            consumer = self.store.get_consumer(None, None, 'cachedkey')
+        self.assertEqual(consumer, self.consumer)
+
+    def test_consumer_save_invalidates_cache(self):
+        self.store.get_consumer(None, None, 'cachedkey')
+        self.consumer.secret = 'changed'
+        self.consumer.save()
+
+        with self.assertNumQueries(1):
+            consumer = self.store.get_consumer(None, None, 'cachedkey')
+        self.assertEqual(consumer.secret, 'changed')
+
+    def test_consumer_delete_invalidates_cache(self):
+        self.store.get_consumer(None, None, 'cachedkey')
+        self.consumer.delete()
+
+        self.assertRaises(InvalidConsumerError, self.store.get_consumer, None, None, 'cachedkey')
+
+
+class BloomFilterTest(TestCase):
+    def test_membership(self):
+        bloom_filter = BloomFilter(100)
+        keys = ['key%d' % i for i in range(100)]
+        for key in keys:
+            bloom_filter.add(key)
+
+        self.assertTrue(all(key in bloom_filter for key in keys))
+        false_positives = sum('other%d' % i in bloom_filter for i in range(1000))
+        self.assertLess(false_positives, 50)
+
+
+class FilteredModelStoreTest(TestCase):
+    def setUp(self):
+        self.store = FilteredModelStore()
+        self.consumer = Consumer.objects.create(key='consumerkey', secret='secret', name='consumer')
+        # build the filter
+        self.store.get_consumer(None, None, 'consumerkey')
+
+    def test_unknown_consumer_is_rejected_without_query(self):
+        with self.assertNumQueries(0):
+            self.assertRaises(InvalidConsumerError, self.store.get_consumer, None, None, 'unknownkey')
+            self.assertRaises(InvalidConsumerError, self.store.get_consumer_and_access_token,
+                              None, None, 'unknownkey', 'tokenkey')
+
+    def test_new_consumer_is_added_to_filter(self):
+        Consumer.objects.create(key='newkey', secret='secret', name='new')
+        self.assertEqual(self.store.get_consumer(None, None, 'newkey').key, 'newkey')
+
+    def test_missing_token_is_remembered(self):
+        # the consumer is only read again to tell it apart from a bad token
+        with self.assertNumQueries(3):
+            for i in range(2):
+                self.assertRaises(InvalidTokenError, self.store.get_consumer_and_access_token,
+                                  None, None, 'consumerkey', 'unknowntoken')
+                self.assertRaises(InvalidTokenError, self.store.get_request_token, None, None, 'unknowntoken')
+
+
+class ModelStoreCheckNonceTest(TestCase):
+    def setUp(self):
+        self.store = ModelStore()
+        self.oauth_request = {'oauth_consumer_key': 'consumerkey', 'oauth_token': 'tokenkey'}
+        self.timestamp = int(time.time())
+
+    def test_replayed_nonce_is_rejected(self):
+        self.assertTrue(self.store.check_nonce(None, self.oauth_request, 'nonce', self.timestamp))
+        self.assertFalse(self.store.check_nonce(None, self.oauth_request, 'nonce', self.timestamp))
+        self.assertEqual(Nonce.objects.count(), 1)
+
+    def test_nonce_is_scoped_to_token(self):
+        self.assertTrue(self.store.check_nonce(None, self.oauth_request, 'nonce', self.timestamp))
+        self.oauth_request['oauth_token'] = 'othertokenkey'
+        self.assertTrue(self.store.check_nonce(None, self.oauth_request, 'nonce', self.timestamp))
+
+    def test_single_insert(self):
+        # the savepoint statements come from the test case transaction
+        with self.assertNumQueries(3):
+            self.store.check_nonce(None, self.oauth_request, 'nonce', self.timestamp)
+
+
+class CacheNonceModelStoreTest(TestCase):
+    def setUp(self):
+        self.store = CacheNonceModelStore()
+        self.store._cache.clear()
+        self.oauth_request = {'oauth_consumer_key': 'consumerkey', 'oauth_token': 'tokenkey'}
+        self.timestamp = int(time.time())
+
+    def test_replayed_nonce_is_rejected(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(self.store.check_nonce(None, self.oauth_request, 'nonce', self.timestamp))
+            self.assertFalse(self.store.check_nonce(None, self.oauth_request, 'nonce', self.timestamp))
+            self.assertTrue(self.store.check_nonce(None, self.oauth_request, 'nonce', self.timestamp - 1))
+            self.oauth_request['oauth_token'] = 'othertokenkey'
+            self.assertTrue(self.store.check_nonce(None, self.oauth_request, 'nonce', self.timestamp))
+
+    def test_stale_nonce_is_rejected(self):
+        self.assertFalse(self.store.check_nonce(None, self.oauth_request, 'nonce', self.timestamp - 3600))
+
+    @mock.patch('oauth_provider.store.cached.NONCE_CACHE', 'default')
+    def test_local_memory_cache_is_refused(self):
+        self.assertRaises(ImproperlyConfigured, CacheNonceModelStore)
+
+    @mock.patch('oauth_provider.store.cached.NONCE_CACHE', 'dummy')
+    def test_dummy_cache_is_refused(self):
+        with self.settings(CACHES=dict(settings.CACHES, dummy={
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache'})):
+            self.assertRaises(ImproperlyConfigured, CacheNonceModelStore)
+
+
+class CombinedModelStoreTest(TestCase):
+    def test_every_store_is_initialized(self):
+        class CombinedModelStore(CachedConsumerModelStore, CacheNonceModelStore):
+            pass
+
+        store = CombinedModelStore()
+        store._cache.clear()
+        Consumer.objects.create(key='consumerkey', secret='secret', name='consumer')
+        oauth_request = {'oauth_consumer_key': 'consumerkey'}
+
+        self.assertTrue(store.check_nonce(None, oauth_request, 'nonce', int(time.time())))
+        self.assertEqual(store.get_consumer(None, oauth_request, 'consumerkey').key, 'consumerkey')
+        with self.assertNumQueries(0):
+            store.get_consumer(None, oauth_request, 'consumerkey')
+
+
+class NonceWindowTest(TestCase):
+    def test_replay_within_window(self):
+        window = NonceWindow(10)
+        self.assertTrue(window.add('nonce', 100, 105))
+        self.assertFalse(window.add('nonce', 100, 105))
+        self.assertTrue(window.add('nonce', 101, 105))
+
+    def test_expired_seconds_are_dropped(self):
+        window = NonceWindow(10)
+        window.add('nonce', 100, 105)
+        window.add('other', 108, 108)
+        self.assertFalse(window.add('late', 99, 110))
+        self.assertTrue(window.add('nonce', 111, 111))
+        self.assertEqual(len(window), 2)
+        # long after the last request everything has expired
+        window.add('nonce', 1000, 1000)
+        self.assertEqual(len(window), 1)
+
+
+class WriteBehindNonceModelStoreTest(TestCase):
+    def setUp(self):
+        self.store = WriteBehindNonceModelStore()
+        self.store.flush_interval = 0
+        self.oauth_request = {'oauth_consumer_key': 'consumerkey', 'oauth_token': 'tokenkey'}
+        self.timestamp = int(time.time())
+
+    def test_nonces_are_saved_on_flush(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(self.store.check_nonce(None, self.oauth_request, 'nonce', self.timestamp))
+            self.assertFalse(self.store.check_nonce(None, self.oauth_request, 'nonce', self.timestamp))
+            self.assertTrue(self.store.check_nonce(None, self.oauth_request, 'other', self.timestamp))
+        self.assertEqual(Nonce.objects.count(), 0)
+
+        self.assertEqual(self.store.flush(), 2)
+        self.assertEqual(Nonce.objects.count(), 2)
+
+    def test_recent_nonces_are_loaded(self):
+        Nonce.objects.create(consumer_key='consumerkey', token_key='tokenkey', key='nonce', timestamp=self.timestamp)
+        self.assertFalse(self.store.check_nonce(None, self.oauth_request, 'nonce', self.timestamp))
+
+    def test_nonce_saved_by_another_process(self):
+        self.store.check_nonce(None, self.oauth_request, 'nonce', self.timestamp)
+        self.store.check_nonce(None, self.oauth_request, 'other', self.timestamp)
+        Nonce.objects.create(consumer_key='consumerkey', token_key='tokenkey', key='nonce', timestamp=self.timestamp)
+
+        self.store.flush()
+        self.assertEqual(Nonce.objects.count(), 2)
+
+
+class ModelStoreAccessTokenTest(TestCase):
+    def setUp(self):
+        self.store = ModelStore()
+        self.user = get_user_model().objects.create_user('john', 'john@example.com', 'password')
+        self.scope = Scope.objects.create(name='photos', url='/oauth/photo/')
+        self.consumer = Consumer.objects.create(key='consumerkey', secret='secret', name='consumer')
+        self.other_consumer = Consumer.objects.create(key='otherkey', secret='secret', name='other')
+        self.token = Token.objects.create_token(
+            consumer=self.consumer, token_type=Token.ACCESS, timestamp=int(time.time()),
+            scope=self.scope, user=self.user)
+
+    def test_single_query(self):
+        with self.assertNumQueries(1):
+            consumer, token = self.store.get_consumer_and_access_token(None, None, 'consumerkey', self.token.key)
+            self.assertEqual(consumer, self.consumer)
+            self.assertEqual(token.scope.name, 'photos')
+            self.assertEqual(token.user, self.user)
+
+    def test_token_of_another_consumer(self):
+        self.assertRaises(InvalidTokenError, self.store.get_consumer_and_access_token,
+                          None, None, 'otherkey', self.token.key)
+
+    def test_expired_token(self):
+        self.consumer.access_token_lifetime = 60
+        self.consumer.save()
+        Token.objects.filter(pk=self.token.pk).update(timestamp=int(time.time()) - 120)
+
+        with self.assertNumQueries(1):
+            self.assertRaises(InvalidTokenError, self.store.get_consumer_and_access_token,
+                              None, None, 'consumerkey', self.token.key)
+        self.assertRaises(InvalidTokenError, self.store.get_access_token, None, None, self.consumer, self.token.key)
+
+    def test_unknown_consumer(self):
+        self.assertRaises(InvalidConsumerError, self.store.get_consumer_and_access_token,
+                          None, None, 'unknownkey', self.token.key)
+
+    def test_unknown_token(self):
+        self.assertRaises(InvalidTokenError, self.store.get_consumer_and_access_token,
+                          None, None, 'consumerkey', 'unknowntoken')
+
+
+@mock.patch('oauth_provider.store.db.READ_DATABASE', 'replica')
+class ModelStoreReadDatabaseTest(TestCase):
+    def setUp(self):
+        # the in-memory test database cannot be opened twice, let the replica
+        # alias share the primary's connection, its queries are still logged
+        # apart
+        connections['default'].ensure_connection()
+        patcher = mock.patch.object(connections['replica'], 'connection', connections['default'].connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.store = ModelStore()
+        self.user = get_user_model().objects.create_user('john', 'john@example.com', 'password')
+        self.consumer = Consumer.objects.create(key='consumerkey', secret='secret', name='consumer')
+        self.token = Token.objects.create_token(
+            consumer=self.consumer, token_type=Token.ACCESS, timestamp=int(time.time()), scope=None)
+
+    @contextmanager
+    def assertQueriesOn(self, replica, primary):
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            with CaptureQueriesContext(connections['default']) as primary_queries:
+                yield
+        self.assertEqual((len(replica_queries), len(primary_queries)), (replica, primary))
+
+    def test_found_on_replica(self):
+        with self.assertQueriesOn(replica=1, primary=0):
+            consumer, token = self.store.get_consumer_and_access_token(None, None, 'consumerkey', self.token.key)
+        self.assertEqual(token._state.db, 'default')
+        self.assertEqual(token.consumer._state.db, 'default')
+
+    def test_missing_rows_are_retried_on_primary(self):
+        with self.assertQueriesOn(replica=1, primary=1):
+            self.assertRaises(InvalidConsumerError, self.store.get_consumer, None, None, 'unknownkey')
+        with self.assertQueriesOn(replica=1, primary=1):
+            self.assertRaises(InvalidTokenError, self.store.get_access_token, None, None, self.consumer, 'unknown')
+
+    def test_request_tokens_are_read_from_primary(self):
+        request_token = Token.objects.create_token(
+            consumer=self.consumer, token_type=Token.REQUEST, timestamp=int(time.time()), scope=None)
+        with self.assertQueriesOn(replica=0, primary=1):
+            self.store.get_request_token(None, None, request_token.key)
+        with self.assertQueriesOn(replica=0, primary=1):
+            self.assertRaises(InvalidTokenError, self.store.get_request_token, None, None, 'unknown')
+
+    def test_writes_go_to_primary(self):
+        request_token = Token.objects.create_token(
+            consumer=self.consumer, token_type=Token.REQUEST, timestamp=int(time.time()), scope=None)
+        request = RequestFactory().get('/')
+        request.user = self.user
+        oauth_request = oauth.Request(parameters={'oauth_timestamp': str(int(time.time()))})
+
+        with self.assertQueriesOn(replica=0, primary=1):
+            request_token = self.store.get_request_token(request, oauth_request, request_token.key)
+        with self.assertQueriesOn(replica=0, primary=1):
+            self.store.authorize_request_token(request, oauth_request, request_token)
+        with self.assertQueriesOn(replica=0, primary=2):
+            access_token = self.store.create_access_token(request, oauth_request, self.consumer, request_token)
+        self.assertEqual(access_token._state.db, 'default')
+        self.assertTrue(Token.objects.using('default').filter(key=access_token.key).exists())
+
+
+class ModelStoreIdentityMapTest(TestCase):
+    def setUp(self):
+        self.store = ModelStore()
+        self.request = RequestFactory().get('/')
+        self.consumer = Consumer.objects.create(key='consumerkey', secret='secret', name='consumer')
+        self.token = Token.objects.create_token(
+            consumer=self.consumer, token_type=Token.ACCESS, timestamp=int(time.time()), scope=None)
+
+    def test_consumer_loaded_once_per_request(self):
+        with self.assertNumQueries(1):
+            consumer = self.store.get_consumer(self.request, None, 'consumerkey')
+            self.assertIs(self.store.get_consumer(self.request, None, 'consumerkey'), consumer)
+
+        with self.assertNumQueries(1):
+            self.store.get_consumer(RequestFactory().get('/'), None, 'consumerkey')
+
+    def test_token_shares_consumer_instance(self):
+        consumer = self.store.get_consumer(self.request, None, 'consumerkey')
+        with self.assertNumQueries(1):
+            token = self.store.get_access_token(self.request, None, consumer, self.token.key)
+            self.assertIs(self.store.get_access_token(self.request, None, consumer, self.token.key), token)
+            self.assertEqual(self.store.get_consumer_and_access_token(
+                self.request, None, 'consumerkey', self.token.key), (consumer, token))
+        self.assertIs(token.consumer, consumer)
+
+    @mock.patch('oauth_provider.models.REQUEST_TOKEN_LIFETIME', 600)
+    def test_expired_request_token(self):
+        token = Token.objects.create_token(
+            consumer=self.consumer, token_type=Token.REQUEST, timestamp=int(time.time()) - 3600, scope=None)
+        self.assertRaises(InvalidTokenError, self.store.get_request_token, self.request, None, token.key)
+        # also once it is loaded
+        self.assertRaises(InvalidTokenError, self.store.get_request_token, self.request, None, token.key)
+
+    def test_create_request_token_does_not_reload_consumer(self):
+        consumer = self.store.get_consumer(self.request, None, 'consumerkey')
+        oauth_request = oauth.Request(parameters={
+            'oauth_consumer_key': 'consumerkey', 'oauth_timestamp': str(int(time.time()))})
+
+        token = self.store.create_request_token(self.request, oauth_request, consumer, 'oob')
+
+        with self.assertNumQueries(0):
+            self.assertIs(self.store.get_request_token(self.request, oauth_request, token.key), token)
+            self.assertIs(self.store.get_consumer_for_request_token(self.request, oauth_request, token), consumer)
+
+
+class ModelStoreRevokeTokensTest(TestCase):
+    def setUp(self):
+        self.store = ModelStore()
+        self.user = get_user_model().objects.create_user('john', 'john@example.com', 'password')
+        self.consumer = Consumer.objects.create(key='consumerkey', secret='secret', name='consumer')
+        self.other_consumer = Consumer.objects.create(key='otherkey', secret='secret', name='other')
+        self.tokens = [
+            Token.objects.create_token(consumer=consumer, token_type=Token.ACCESS,
+                                       timestamp=int(time.time()), scope=None, user=user)
+            for consumer, user in [(self.consumer, self.user), (self.consumer, None),
+                                   (self.other_consumer, self.user), (self.other_consumer, None)]]
+
+        self.received = []
+        tokens_revoked.connect(self._received, sender=Token)
+        self.addCleanup(tokens_revoked.disconnect, self._received, sender=Token)
+
+    def _received(self, sender, **kwargs):
+        kwargs.pop('signal')
+        self.received.append(kwargs)
+
+    def _remaining(self):
+        return set(Token.objects.values_list('pk', flat=True))
+
+    def test_revoke_tokens_for_user(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.store.revoke_tokens_for_user(self.user), 2)
+        self.assertEqual(self._remaining(), set([self.tokens[1].pk, self.tokens[3].pk]))
+        self.assertEqual(self.received, [{'keys': None, 'user': self.user, 'consumer': None, 'count': 2}])
+
+    def test_revoke_tokens_for_consumer(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.store.revoke_tokens_for_consumer(self.consumer), 2)
+        self.assertEqual(self._remaining(), set([self.tokens[2].pk, self.tokens[3].pk]))
+        self.assertEqual(self.received, [{'keys': None, 'user': None, 'consumer': self.consumer, 'count': 2}])
+
+    def test_revoke_tokens(self):
+        keys = [self.tokens[0].key, self.tokens[3].key, 'unknownkey']
+        self.assertEqual(self.store.revoke_tokens(iter(keys)), 2)
+        self.assertEqual(self._remaining(), set([self.tokens[1].pk, self.tokens[2].pk]))
+        self.assertEqual(self.received, [{'keys': keys, 'user': None, 'consumer': None, 'count': 2}])
+
+    def test_revoke_tokens_in_batches(self):
+        keys = [token.key for token in self.tokens]
+        with mock.patch.object(connection.ops, 'bulk_batch_size', return_value=3):
+            self.assertEqual(self.store.revoke_tokens(keys), 4)
+        self.assertEqual(self._remaining(), set())
+        self.assertEqual(len(self.received), 1)
+
+    def test_queryset_delete(self):
+        self.assertEqual(Token.objects.filter(user=self.user).delete()[0], 2)
+        self.assertEqual(self.received, [{'keys': [self.tokens[0].key, self.tokens[2].key],
+                                          'user': None, 'consumer': None, 'count': 2}])
+
+    def test_token_delete(self):
+        self.tokens[0].delete()
+        self.assertEqual(self.received, [{'keys': [self.tokens[0].key], 'user': None, 'consumer': None, 'count': 1}])
+
+    def test_request_token_exchange(self):
+        request_token = Token.objects.create_token(
+            consumer=self.consumer, token_type=Token.REQUEST, timestamp=int(time.time()),
+            scope=None, user=self.user)
+        oauth_request = oauth.Request(parameters={'oauth_timestamp': str(int(time.time()))})
+        self.store.create_access_token(None, oauth_request, self.consumer, request_token)
+        self.assertFalse(Token.objects.filter(pk=request_token.pk).exists())
+        self.assertEqual(self.received, [])
+
+
+class SignedTokenModelStoreConfigurationTest(TestCase):
+    @mock.patch('oauth_provider.store.signed.REVOCATION_CACHE', None)
+    def test_revocation_cache_is_required(self):
+        self.assertRaises(ImproperlyConfigured, SignedTokenModelStore)
+
+    @mock.patch('oauth_provider.store.signed.REVOCATION_CACHE', 'missing')
+    def test_unknown_revocation_cache(self):
+        self.assertRaises(ImproperlyConfigured, SignedTokenModelStore)
+
+    @mock.patch('oauth_provider.store.signed.REVOCATION_CACHE', 'default')
+    def test_local_memory_revocation_cache(self):
+        self.assertRaises(ImproperlyConfigured, SignedTokenModelStore)
+
+    @mock.patch('oauth_provider.store.signed.KEY_SIZE', 16)
+    def test_key_size_must_fit(self):
+        self.assertRaises(ImproperlyConfigured, SignedTokenModelStore)
+
+    def test_user_primary_key_must_fit(self):
+        user_model = mock.Mock(__name__='User')
+        user_model._meta.pk.get_internal_type.return_value = 'UUIDField'
+        with mock.patch('oauth_provider.store.signed.get_user_model', return_value=user_model):
+            self.assertRaises(ImproperlyConfigured, SignedTokenModelStore)
+
+
+class SignedTokenModelStoreTest(TestCase):
+    def setUp(self):
+        self.store = SignedTokenModelStore()
+        caches[REVOCATION_CACHE].clear()
+        self.user = get_user_model().objects.create_user('john', 'john@example.com', 'password')
+        self.scope = Scope.objects.create(name='photos', url='/oauth/photo/')
+        self.consumer = Consumer.objects.create(key='consumerkey', secret='secret', name='consumer')
+        self.other_consumer = Consumer.objects.create(key='otherkey', secret='secret', name='other')
+        request_token = Token.objects.create_token(
+            consumer=self.consumer, token_type=Token.REQUEST, timestamp=int(time.time()),
+            scope=self.scope, user=self.user)
+        oauth_request = oauth.Request(parameters={'oauth_timestamp': str(int(time.time()))})
+        self.token = self.store.create_access_token(None, oauth_request, self.consumer, request_token)
+
+    def test_token_is_signed(self):
+        self.assertEqual(len(self.token.key), 32)
+        self.assertEqual(Token.objects.get(key=self.token.key).secret, self.token.secret)
+
+    def test_key_collision_is_drawn_again(self):
+        oauth_request = oauth.Request(parameters={'oauth_timestamp': str(int(time.time()))})
+        now = time.time()
+        keys = []
+        with mock.patch('oauth_provider.store.signed.time.time', return_value=now):
+            with mock.patch('random.SystemRandom.getrandbits', side_effect=[7, 7, 8]):
+                for i in range(2):
+                    request_token = Token.objects.create_token(
+                        consumer=self.consumer, token_type=Token.REQUEST, timestamp=int(now),
+                        scope=self.scope, user=self.user)
+                    keys.append(self.store.create_access_token(None, oauth_request, self.consumer, request_token).key)
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(Token.objects.filter(key__in=keys).count(), 2)
+
+    def test_token_lookup_does_not_read_tokens(self):
+        with self.assertNumQueries(1):
+            consumer, token = self.store.get_consumer_and_access_token(None, None, 'consumerkey', self.token.key)
+        self.assertEqual(consumer, self.consumer)
+        self.assertEqual(token.secret, self.token.secret)
+        self.assertEqual(token.user_id, self.user.pk)
+        self.assertEqual(token.scope_id, self.scope.pk)
+
+    def test_token_of_another_consumer(self):
+        self.assertRaises(InvalidTokenError, self.store.get_consumer_and_access_token,
+                          None, None, 'otherkey', self.token.key)
+
+    def test_tampered_token(self):
+        key = self.token.key[:-1] + ('A' if self.token.key[-1] != 'A' else 'B')
+        self.assertRaises(InvalidTokenError, self.store.get_consumer_and_access_token,
+                          None, None, 'consumerkey', key)
+
+    def test_deleted_token_is_revoked(self):
+        self.token.delete()
+        self.assertRaises(InvalidTokenError, self.store.get_consumer_and_access_token,
+                          None, None, 'consumerkey', self.token.key)
+
+    def test_revocation_expires_with_token(self):
+        self.consumer.access_token_lifetime = 60
+        self.consumer.save()
+        cache = caches[REVOCATION_CACHE]
+        with mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            self.token.delete()
+        (entries, timeout), kwargs = set_many.call_args
+        self.assertEqual(list(entries), [_revoked_cache_key(self.token.key)])
+        # the 60 seconds left and a second of margin, rounded up to the minute
+        self.assertEqual(timeout, 120)
+
+    def test_expired_tokens_are_not_recorded(self):
+        self.consumer.access_token_lifetime = 60
+        self.consumer.save()
+        request_token = Token.objects.create_token(
+            consumer=self.consumer, token_type=Token.REQUEST, timestamp=int(time.time()),
+            scope=self.scope, user=self.user)
+        oauth_request = oauth.Request(parameters={'oauth_timestamp': str(int(time.time()))})
+        with mock.patch('oauth_provider.store.signed.time.time', return_value=time.time() - 120):
+            token = self.store.create_access_token(None, oauth_request, self.consumer, request_token)
+
+        self.store.revoke_tokens([token.key, self.token.key])
+        self.assertIsNone(caches[REVOCATION_CACHE].get(_revoked_cache_key(token.key)))
+        self.assertTrue(caches[REVOCATION_CACHE].get(_revoked_cache_key(self.token.key)))
+
+    def test_purged_token_is_not_recorded(self):
+        self.consumer.access_token_lifetime = 60
+        self.consumer.save()
+        Token.objects.filter(pk=self.token.pk).update(timestamp=int(time.time()) - 120)
+
+        # the store does not keep the purge from deleting in a single DELETE
+        with self.assertNumQueries(2):
+            self.assertEqual(Token.objects.delete_expired_access_tokens().deleted, 1)
+        self.assertIsNone(caches[REVOCATION_CACHE].get(_revoked_cache_key(self.token.key)))
+
+    def test_unsigned_token_is_read_from_database(self):
+        token = Token.objects.create_token(
+            consumer=self.consumer, token_type=Token.ACCESS, timestamp=int(time.time()), scope=None)
+        consumer, loaded = self.store.get_consumer_and_access_token(None, None, 'consumerkey', token.key)
+        self.assertEqual(loaded.pk, token.pk)
+
+    def test_bulk_revoked_tokens(self):
+        self.assertEqual(self.store.revoke_tokens([self.token.key]), 1)
+        self.assertRaises(InvalidTokenError, self.store.get_consumer_and_access_token,
+                          None, None, 'consumerkey', self.token.key)
+
+    def test_tokens_revoked_for_user(self):
+        self.store.revoke_tokens_for_user(self.user)
+        self.assertRaises(InvalidTokenError, self.store.get_consumer_and_access_token,
+                          None, None, 'consumerkey', self.token.key)
+
+    def test_tokens_revoked_for_consumer(self):
+        self.store.revoke_tokens_for_consumer(self.other_consumer)
+        self.store.get_consumer_and_access_token(None, None, 'consumerkey', self.token.key)
+
+        self.store.revoke_tokens_for_consumer(self.consumer)
+        self.assertRaises(InvalidTokenError, self.store.get_consumer_and_access_token,
+                          None, None, 'consumerkey', self.token.key)
+
+    def test_tokens_issued_after_revocation(self):
+        self.store.revoke_tokens_for_user(self.user)
+        request_token = Token.objects.create_token(
+            consumer=self.consumer, token_type=Token.REQUEST, timestamp=int(time.time()),
+            scope=self.scope, user=self.user)
+        oauth_request = oauth.Request(parameters={'oauth_timestamp': str(int(time.time()))})
+        with mock.patch('oauth_provider.store.signed.time.time', return_value=time.time() + 1):
+            token = self.store.create_access_token(None, oauth_request, self.consumer, request_token)
+        consumer, loaded = self.store.get_consumer_and_access_token(None, None, 'consumerkey', token.key)
+        self.assertEqual(loaded.key, token.key)
+
+    def test_user_revocation_expires(self):
+        self.consumer.access_token_lifetime = 60
+        self.consumer.save()
+        self.other_consumer.access_token_lifetime = 600
+        self.other_consumer.save()
+        cache = caches[REVOCATION_CACHE]
+        with mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            self.store.revoke_tokens_for_user(self.user)
+        (entries, timeout), kwargs = set_many.call_args
+        # outlives the tokens of the consumer with the longest lifetime
+        self.assertEqual(timeout, 660)
+
+    def test_tokens_of_deleted_user(self):
+        self.user.delete()
+        self.assertRaises(InvalidTokenError, self.store.get_consumer_and_access_token,
+                          None, None, 'consumerkey', self.token.key)
+
+    def test_tokens_of_deleted_scope(self):
+        self.scope.delete()
+        self.assertFalse(Token.objects.filter(key=self.token.key).exists())
+        self.assertRaises(InvalidTokenError, self.store.get_access_token, None, None, self.consumer, self.token.key)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import time
+
+import mock
+from django.test import TestCase
+
+from oauth_provider.tests.auth import BaseOAuthTestCase
+from oauth_provider.timing import HistogramCollector, null_phase, timed
+
+
+class HistogramCollectorTest(TestCase):
+    def test_snapshot(self):
+        collector = HistogramCollector(buckets=[0.01, 0.1])
+        collector.record('nonce', 0.005, True)
+        collector.record('nonce', 0.05, True)
+        collector.record('nonce', 5, True)
+        collector.record('nonce', 0.05, False)
+
+        snapshot = collector.snapshot()
+        self.assertEqual(snapshot['nonce']['ok']['count'], 3)
+        self.assertAlmostEqual(snapshot['nonce']['ok']['sum'], 5.055)
+        self.assertEqual(snapshot['nonce']['ok']['buckets'], [(0.01, 1), (0.1, 2), (float('inf'), 3)])
+        self.assertEqual(snapshot['nonce']['failed']['count'], 1)
+
+        collector.reset()
+        self.assertEqual(collector.snapshot(), {})
+
+    def test_disabled_by_default(self):
+        self.assertIs(timed('nonce'), null_phase)
+
+
+class TimedViewsTest(BaseOAuthTestCase):
+    def setUp(self):
+        super(TimedViewsTest, self).setUp()
+        self.collector = HistogramCollector()
+        patcher = mock.patch('oauth_provider.timing.collector', self.collector)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_phases(self):
+        self._request_token()
+        snapshot = self.collector.snapshot()
+        self.assertEqual(sorted(snapshot), ['consumer', 'nonce', 'parse', 'signature'])
+        self.assertTrue(all(list(phase) == ['ok'] for phase in snapshot.values()))
+
+        self.collector.reset()
+        self._authorize_and_access_token_using_form()
+        response = self.c.get("/oauth/none/", {
+            'oauth_consumer_key': self.CONSUMER_KEY,
+            'oauth_token': self.ACCESS_TOKEN_KEY,
+            'oauth_signature_method': 'PLAINTEXT',
+            'oauth_signature': '%s&wrong' % self.CONSUMER_SECRET,
+            'oauth_timestamp': str(int(time.time())),
+            'oauth_nonce': 'timednonce',
+            'oauth_version': '1.0',
+        })
+        self.assertEqual(response.status_code, 401)
+        snapshot = self.collector.snapshot()
+        self.assertEqual(snapshot['token']['ok']['count'], 2)
+        self.assertEqual(snapshot['signature']['failed']['count'], 1)
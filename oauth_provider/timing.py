@@ -0,0 +1,149 @@
+from __future__ import absolute_import
+
+import threading
+from bisect import bisect_left
+from time import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from oauth_provider.compat import importlib
+
+
+class Collector(object):
+    """
+    Receives how long each phase of handling an OAuth request took and
+    whether it succeeded. Subclasses implement `record`, set
+    `OAUTH_TIMING_COLLECTOR` to use them. The phases are:
+
+        parse      turning the Django request into an `oauth2.Request`
+        consumer   loading the consumer
+        token      loading the request or access token (with its consumer
+                   for protected resources, which are looked up together)
+        nonce      `Store.check_nonce`
+        signature  verifying the signature
+
+    The default `NullCollector` records nothing and costs a function call per
+    phase.
+    """
+    enabled = True
+
+    def record(self, phase, seconds, ok):
+        raise NotImplementedError
+
+
+class NullCollector(Collector):
+    enabled = False
+
+    def record(self, phase, seconds, ok):
+        pass
+
+
+class HistogramCollector(Collector):
+    """
+    Thread-safe in-memory histograms of the phase durations, split by outcome.
+
+    `buckets` are the upper bounds in seconds; `snapshot()` returns cumulative
+    counts like Prometheus histograms do.
+    """
+    buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+    def __init__(self, buckets=None):
+        if buckets is not None:
+            self.buckets = tuple(sorted(buckets))
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, phase, seconds, ok):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            stats = self._stats.get((phase, ok))
+            if stats is None:
+                # one counter per bucket and one for slower samples, then the sum
+                stats = self._stats[phase, ok] = [0] * (len(self.buckets) + 1) + [0.0]
+            stats[index] += 1
+            stats[-1] += seconds
+
+    def snapshot(self):
+        """
+        Return `{phase: {'ok' or 'failed': {'count', 'sum', 'buckets'}}}` where
+        `buckets` is a list of `(upper bound, cumulative count)` pairs.
+        """
+        with self._lock:
+            stats = dict((key, list(value)) for key, value in self._stats.items())
+
+        result = {}
+        for (phase, ok), counts in stats.items():
+            cumulative, buckets = 0, []
+            for bound, count in zip(self.buckets + (float('inf'),), counts[:-1]):
+                cumulative += count
+                buckets.append((bound, cumulative))
+            result.setdefault(phase, {})['ok' if ok else 'failed'] = {
+                'count': cumulative, 'sum': counts[-1], 'buckets': buckets}
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def get_collector(path='oauth_provider.timing.NullCollector'):
+    """
+    Load the timing collector. Should not be called directly unless testing.
+    """
+    path = getattr(settings, 'OAUTH_TIMING_COLLECTOR', path)
+
+    try:
+        module, attr = path.rsplit('.', 1)
+        collector_class = getattr(importlib.import_module(module), attr)
+    except ValueError:
+        raise ImproperlyConfigured('Invalid timing collector string: "%s"' % path)
+    except ImportError as e:
+        raise ImproperlyConfigured('Error loading timing collector module "%s": "%s"' % (module, e))
+    except AttributeError:
+        raise ImproperlyConfigured('Module "%s" does not define a timing collector named "%s"' % (module, attr))
+
+    return collector_class()
+
+
+collector = get_collector()
+
+
+class Phase(object):
+    """
+    Context manager timing one phase. Set `ok` to False when the phase fails
+    without raising.
+    """
+    __slots__ = ('name', 'ok', 'started')
+
+    def __init__(self, name):
+        self.name = name
+        self.ok = True
+
+    def __enter__(self):
+        self.started = time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        collector.record(self.name, time() - self.started, self.ok and exc_type is None)
+
+
+class NullPhase(object):
+    # shared by all requests: `ok` may be set on it but must not be read back
+    ok = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+null_phase = NullPhase()
+
+
+def timed(phase):
+    """Return a context manager reporting the duration of `phase`."""
+    if not collector.enabled:
+        return null_phase
+    return Phase(phase)
@@ -1,17 +1,98 @@
 from __future__ import absolute_import
 
+import threading
+from time import time
+
 import oauth2 as oauth
 import six
 from django.conf import settings
 from django.contrib.auth import authenticate
+from django.core.exceptions import ImproperlyConfigured
 from django.http import HttpResponse, HttpResponseBadRequest
 from six.moves.urllib.parse import urlparse, urlunparse
 
-from .consts import MAX_URL_LENGTH
+from .consts import MAX_URL_LENGTH, NONCE_VALID_PERIOD
+from .signature_methods import SignatureMethod_HMAC_SHA256, SignatureMethod_RSA_SHA1
+from .timing import timed
 
 OAUTH_REALM_KEY_NAME = getattr(settings, 'OAUTH_REALM_KEY_NAME', '')
 OAUTH_SIGNATURE_METHODS = getattr(settings, 'OAUTH_SIGNATURE_METHODS', ['plaintext', 'hmac-sha1'])
 OAUTH_BLACKLISTED_HOSTNAMES = getattr(settings, 'OAUTH_BLACKLISTED_HOSTNAMES', [])
+OAUTH_TIMESTAMP_THRESHOLD = getattr(settings, 'OAUTH_TIMESTAMP_THRESHOLD', oauth.Server.timestamp_threshold)
+
+
+class SignatureMethodRegistry(object):
+    """
+    Thread-safe registry of the signature methods the provider accepts.
+
+    A single `oauth2.Server` is built from the registered methods named in
+    `enabled` and shared by all requests; registering a method swaps in a new
+    one. Timing hooks are called as `hook(signature_method_name, seconds,
+    verified)` after every verification.
+    """
+    def __init__(self, enabled):
+        self.enabled = set(name.lower() for name in enabled)
+        self._methods = {}
+        self._server = None
+        self._timing_hooks = ()
+        self._lock = threading.Lock()
+
+    def register(self, signature_method):
+        """Make `signature_method` available under its lowercased name."""
+        with self._lock:
+            methods = dict(self._methods)
+            methods[signature_method.name.lower()] = signature_method
+            self._methods = methods
+            self._server = None
+
+    def add_timing_hook(self, hook):
+        with self._lock:
+            self._timing_hooks += (hook,)
+
+    def remove_timing_hook(self, hook):
+        with self._lock:
+            self._timing_hooks = tuple(h for h in self._timing_hooks if h is not hook)
+
+    @property
+    def server(self):
+        """The shared `oauth2.Server`, it must not be modified."""
+        server = self._server
+        if server is None:
+            with self._lock:
+                if self._server is None:
+                    self._server = oauth.Server(dict(
+                        (method.name, method) for name, method in self._methods.items()
+                        if name in self.enabled))
+                server = self._server
+        return server
+
+    def verify_request(self, oauth_request, consumer, token=None):
+        """Verify `oauth_request`, raising `oauth2.Error` if it is invalid."""
+        hooks = self._timing_hooks
+        if not hooks:
+            return self.server.verify_request(oauth_request, consumer, token)
+
+        started = time()
+        verified = False
+        try:
+            parameters = self.server.verify_request(oauth_request, consumer, token)
+            verified = True
+            return parameters
+        finally:
+            elapsed = time() - started
+            name = oauth_request.get('oauth_signature_method')
+            for hook in hooks:
+                hook(name, elapsed, verified)
+
+
+signature_method_registry = SignatureMethodRegistry(OAUTH_SIGNATURE_METHODS)
+signature_method_registry.register(oauth.SignatureMethod_PLAINTEXT())
+signature_method_registry.register(oauth.SignatureMethod_HMAC_SHA1())
+signature_method_registry.register(SignatureMethod_HMAC_SHA256())
+if SignatureMethod_RSA_SHA1.available:
+    signature_method_registry.register(SignatureMethod_RSA_SHA1())
+elif 'rsa-sha1' in signature_method_registry.enabled:
+    raise ImproperlyConfigured('The RSA-SHA1 signature method requires the cryptography package.')
 
 
 def initialize_server_request(request):
@@ -19,11 +100,7 @@ def initialize_server_request(request):
     oauth_request = get_oauth_request(request)
 
     if oauth_request:
-        oauth_server = oauth.Server()
-        if 'plaintext' in OAUTH_SIGNATURE_METHODS:
-            oauth_server.add_signature_method(oauth.SignatureMethod_PLAINTEXT())
-        if 'hmac-sha1' in OAUTH_SIGNATURE_METHODS:
-            oauth_server.add_signature_method(oauth.SignatureMethod_HMAC_SHA1())
+        oauth_server = signature_method_registry.server
     else:
         oauth_server = None
     return oauth_server, oauth_request
@@ -65,12 +142,15 @@ def get_oauth_request(request):
         scheme = request.META["HTTP_X_FORWARDED_PROTO"]
         absolute_uri = urlunparse((scheme, ) + urlparse(absolute_uri)[1:])
 
-    return oauth.Request.from_request(request.method,
-        absolute_uri,
-        headers=auth_header,
-        parameters=parameters,
-        query_string=request.META.get('QUERY_STRING', '')
-    )
+    with timed('parse') as phase:
+        oauth_request = oauth.Request.from_request(request.method,
+            absolute_uri,
+            headers=auth_header,
+            parameters=parameters,
+            query_string=request.META.get('QUERY_STRING', '')
+        )
+        phase.ok = oauth_request is not None
+    return oauth_request
 
 
 def verify_oauth_request(request, oauth_request, consumer, token=None):
@@ -78,23 +158,32 @@ def verify_oauth_request(request, oauth_request, consumer, token=None):
     from .store import store
 
     # Check nonce
-    if not store.check_nonce(request, oauth_request, oauth_request['oauth_nonce'], oauth_request['oauth_timestamp']):
+    with timed('nonce') as phase:
+        valid_nonce = phase.ok = store.check_nonce(
+            request, oauth_request, oauth_request['oauth_nonce'], oauth_request['oauth_timestamp'])
+    if not valid_nonce:
         return False
 
     # Verify request
-    try:
-        oauth_server = oauth.Server()
-        oauth_server.add_signature_method(oauth.SignatureMethod_HMAC_SHA1())
-        oauth_server.add_signature_method(oauth.SignatureMethod_PLAINTEXT())
-
-        # Ensure the passed keys and secrets are ascii, or HMAC will complain.
-        consumer = oauth.Consumer(consumer.key.encode('ascii', 'ignore'), consumer.secret.encode('ascii', 'ignore'))
-        if token is not None:
-            token = oauth.Token(token.key.encode('ascii', 'ignore'), token.secret.encode('ascii', 'ignore'))
-
-        oauth_server.verify_request(oauth_request, consumer, token)
-    except oauth.Error as err:
-        return False
+    with timed('signature') as phase:
+        try:
+            rsa_public_key = getattr(consumer, 'rsa_public_key', None)
+            if oauth_request['oauth_signature_method'] != SignatureMethod_RSA_SHA1.name and (
+                    rsa_public_key or not consumer.secret):
+                # consumers with a public key may have no secret, which anyone
+                # could sign with: they only get RSA-SHA1
+                raise oauth.Error('Signature method not allowed for this consumer.')
+            # Ensure the passed keys and secrets are ascii, or HMAC will complain.
+            consumer = oauth.Consumer(consumer.key.encode('ascii', 'ignore'), consumer.secret.encode('ascii', 'ignore'))
+            # used by the RSA-SHA1 signature method
+            consumer.rsa_public_key = rsa_public_key
+            if token is not None:
+                token = oauth.Token(token.key.encode('ascii', 'ignore'), token.secret.encode('ascii', 'ignore'))
+
+            signature_method_registry.verify_request(oauth_request, consumer, token)
+        except oauth.Error as err:
+            phase.ok = False
+            return False
 
     return True
 
@@ -139,6 +228,70 @@ def require_params(oauth_request, parameters=None):
     return None
 
 
+def check_signature_method(oauth_request):
+    """ Ensures that the signature method is one the provider accepts. """
+    signature_method = oauth_request['oauth_signature_method']
+    if signature_method not in signature_method_registry.server.signature_methods:
+        # the value comes from the request, never serve it as HTML
+        return HttpResponseBadRequest('Unsupported signature method: %s' % signature_method,
+                                      content_type='text/plain')
+    return None
+
+
+def check_timestamp(oauth_request):
+    """
+    Ensures that the timestamp is not further from the current time than
+    `OAUTH_TIMESTAMP_THRESHOLD` seconds, nor older than a nonce is remembered.
+    """
+    try:
+        timestamp = int(oauth_request['oauth_timestamp'])
+    except ValueError:
+        return HttpResponseBadRequest('Invalid timestamp: %s' % oauth_request['oauth_timestamp'],
+                                      content_type='text/plain')
+
+    lapsed = int(time()) - timestamp
+    max_age = OAUTH_TIMESTAMP_THRESHOLD
+    if NONCE_VALID_PERIOD:
+        max_age = min(max_age, NONCE_VALID_PERIOD)
+    if lapsed > max_age or -lapsed > OAUTH_TIMESTAMP_THRESHOLD:
+        return send_oauth_error(oauth.Error('Expired timestamp: given %d and now %d.' % (timestamp, timestamp + lapsed)))
+    return None
+
+
+def check_version(oauth_request):
+    """ Ensures that the request uses OAuth 1.0 if it says which version. """
+    version = oauth_request.get('oauth_version')
+    if version and version != oauth.OAUTH_VERSION:
+        return send_oauth_error(oauth.Error('OAuth version %s not supported.' % version))
+    return None
+
+
+# Run in this order by `prevalidate_oauth_request` once the required
+# parameters are known to be present. Checks must not touch the database.
+prevalidators = [
+    check_signature_method,
+    check_timestamp,
+    check_version,
+]
+
+
+def prevalidate_oauth_request(oauth_request, parameters=None):
+    """
+    Runs every check that can be done in memory, so that malformed, stale or
+    unsupported requests are rejected before the store is queried. Returns the
+    response of the first failing check or None.
+    """
+    response = require_params(oauth_request, parameters)
+    if response is not None:
+        return response
+
+    for prevalidator in prevalidators:
+        response = prevalidator(oauth_request)
+        if response is not None:
+            return response
+    return None
+
+
 def check_valid_callback(callback):
     """
     Checks the size and nature of the callback.
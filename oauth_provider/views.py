@@ -13,15 +13,17 @@ from six.moves.urllib.parse import urlencode
 
 from oauth_provider.compat import UnsafeRedirect
 from .consts import OUT_OF_BAND
-from .decorators import oauth_required
+from .decorators import oauth_authentication_exempt, oauth_required
 from .forms import AuthorizeRequestTokenForm
+from .ratelimit import check_rate_limit
 from .responses import (COULD_NOT_VERIFY_OAUTH_REQUEST_RESPONSE,
                         INVALID_CONSUMER_RESPONSE,
                         INVALID_PARAMS_RESPONSE)
 from .store import InvalidConsumerError, InvalidTokenError, store
+from .timing import timed
 from .utils import (get_oauth_request,
                     is_xauth_request,
-                    require_params,
+                    prevalidate_oauth_request,
                     send_oauth_error,
                     verify_oauth_request)
 
@@ -32,23 +34,30 @@ UNSAFE_REDIRECTS = getattr(settings, "OAUTH_UNSAFE_REDIRECTS", False)
 
 
 @csrf_exempt
+@oauth_authentication_exempt
 def request_token(request):
     oauth_request = get_oauth_request(request)
 
     if oauth_request is None:
         return INVALID_PARAMS_RESPONSE
 
-    missing_params = require_params(oauth_request, ('oauth_callback',))
-    if missing_params is not None:
-        return missing_params
+    invalid_request = prevalidate_oauth_request(oauth_request, ('oauth_callback',))
+    if invalid_request is not None:
+        return invalid_request
+
+    rate_limited = check_rate_limit(oauth_request)
+    if rate_limited is not None:
+        return rate_limited
 
     if is_xauth_request(oauth_request):
         return HttpResponseBadRequest('xAuth not allowed for this method.')
 
-    try:
-        consumer = store.get_consumer(request, oauth_request, oauth_request['oauth_consumer_key'])
-    except InvalidConsumerError:
-        return INVALID_CONSUMER_RESPONSE
+    with timed('consumer') as phase:
+        try:
+            consumer = store.get_consumer(request, oauth_request, oauth_request['oauth_consumer_key'])
+        except InvalidConsumerError:
+            phase.ok = False
+            return INVALID_CONSUMER_RESPONSE
 
     if not verify_oauth_request(request, oauth_request, consumer):
         return COULD_NOT_VERIFY_OAUTH_REQUEST_RESPONSE
@@ -141,32 +150,44 @@ def user_authorization(request, form_class=AuthorizeRequestTokenForm):
 
 
 @csrf_exempt
+@oauth_authentication_exempt
 def access_token(request):
     oauth_request = get_oauth_request(request)
 
     if oauth_request is None:
         return INVALID_PARAMS_RESPONSE
 
-    # Consumer
-    try:
-        consumer = store.get_consumer(request, oauth_request, oauth_request['oauth_consumer_key'])
-    except InvalidConsumerError:
-        return HttpResponseBadRequest('Invalid consumer.')
-
     is_xauth = is_xauth_request(oauth_request)
 
+    # Check Parameters
     if not is_xauth:
+        invalid_request = prevalidate_oauth_request(oauth_request, ('oauth_token', 'oauth_verifier'))
+    else:
+        invalid_request = prevalidate_oauth_request(oauth_request, ('x_auth_username', 'x_auth_password', 'x_auth_mode'))
+    if invalid_request is not None:
+        return invalid_request
 
-        # Check Parameters
-        missing_params = require_params(oauth_request, ('oauth_token', 'oauth_verifier'))
-        if missing_params is not None:
-            return missing_params
+    rate_limited = check_rate_limit(oauth_request, oauth_request.get('oauth_token'))
+    if rate_limited is not None:
+        return rate_limited
 
-        # Check Request Token
+    # Consumer
+    with timed('consumer') as phase:
         try:
-            request_token = store.get_request_token(request, oauth_request, oauth_request['oauth_token'])
-        except InvalidTokenError:
-            return HttpResponseBadRequest('Invalid request token.')
+            consumer = store.get_consumer(request, oauth_request, oauth_request['oauth_consumer_key'])
+        except InvalidConsumerError:
+            phase.ok = False
+            return HttpResponseBadRequest('Invalid consumer.')
+
+    if not is_xauth:
+
+        # Check Request Token
+        with timed('token') as phase:
+            try:
+                request_token = store.get_request_token(request, oauth_request, oauth_request['oauth_token'])
+            except InvalidTokenError:
+                phase.ok = False
+                return HttpResponseBadRequest('Invalid request token.')
         if not request_token.is_approved:
             return HttpResponseBadRequest('Request Token not approved by the user.')
 
@@ -180,11 +201,6 @@ def access_token(request):
 
     else:  # xAuth
 
-        # Check Parameters
-        missing_params = require_params(oauth_request, ('x_auth_username', 'x_auth_password', 'x_auth_mode'))
-        if missing_params is not None:
-            return missing_params
-
         # Check if Consumer allows xAuth
         if not consumer.xauth_allowed:
             return HttpResponseBadRequest('xAuth not allowed for this method')